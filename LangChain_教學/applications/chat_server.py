@@ -0,0 +1,284 @@
+"""個人知識助手的多用戶伺服器模式
+
+以 asyncio 提供簡單的 HTTP JSON 介面，每個 session 擁有獨立的記憶檔：
+
+    POST /chat   {"session_id": "alice", "message": "你好"}  ->  {"response": "..."}
+    GET  /stats  ->  目前的 session 與請求統計
+
+同時進行中的模型呼叫 (包含回答、背景的用戶資料抽取與摘要) 數量受 max_inflight 限制；
+閒置超過 idle_timeout 秒，或記憶體中的 session 超過 max_sessions 時，
+最久未使用的 session 會被寫回磁碟並移出記憶體。
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.llms import LLM
+
+# 讓應用可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from llm_common.batching import batched
+from llm_common.llm_registry import get_llm, connection_stats
+
+from chatbot import AsyncPersonalAssistant
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _on_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+class InflightLimitedLLM(LLM):
+    """所有模型呼叫共用同一個並行上限的 LLM 包裝
+
+    協程中的呼叫直接在 semaphore 內進行；背景執行緒 (例如摘要) 的同步呼叫
+    會交給事件迴圈執行，因此同樣受這個上限限制。
+    """
+
+    llm: Any
+    semaphore: Any
+    loop: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return f"limited-{self.llm._llm_type}"
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None,
+                     run_manager: Any = None, **kwargs: Any) -> str:
+        async with self.semaphore:
+            return await self.llm.ainvoke(prompt, stop=stop, **kwargs)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Any = None, **kwargs: Any) -> str:
+        loop = self.loop
+        if loop is None or not loop.is_running() or _on_loop(loop):
+            # 尚未在事件迴圈中使用 (或在迴圈執行緒內同步呼叫，轉交會造成死結)
+            return self.llm.invoke(prompt, stop=stop, **kwargs)
+        return asyncio.run_coroutine_threadsafe(self._acall(prompt, stop=stop, **kwargs), loop).result()
+
+
+class SessionManager:
+    """管理每個用戶的 AsyncPersonalAssistant，所有 session 共用同一個 LLM"""
+
+    def __init__(self, llm, sessions_dir: str = "sessions", max_sessions: int = 1000,
+                 idle_timeout: float = 600, max_inflight: int = 8, **assistant_kwargs):
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self.llm = InflightLimitedLLM(llm=llm, semaphore=self._inflight)
+        self.sessions_dir = Path(sessions_dir)
+        self.sessions_dir.mkdir(parents=True, exist_ok=True)
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.assistant_kwargs = assistant_kwargs
+
+        # session_id -> (助手, 最後使用時間)，依最近使用排序
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self.requests = 0
+        self.evictions = 0
+
+    def _get_session(self, session_id: str) -> AsyncPersonalAssistant:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            memory_file = self.sessions_dir / f"{session_id}.json"
+            assistant = AsyncPersonalAssistant(llm=self.llm, memory_file=str(memory_file), quiet=True,
+                                               **self.assistant_kwargs)
+            entry = self._sessions[session_id] = [assistant, time.monotonic()]
+        entry[1] = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return entry[0]
+
+    async def chat(self, session_id: str, message: str) -> str:
+        """處理單一 session 的一輪對話；同一 session 的請求依序執行"""
+        if not _SESSION_ID.match(session_id):
+            raise ValueError("session_id 只能包含英數字、底線與連字號 (最多 64 字)")
+
+        if self.llm.loop is None:
+            self.llm.loop = asyncio.get_running_loop()
+
+        while True:
+            lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+            async with lock:
+                if self._session_locks.get(session_id) is not lock:
+                    continue  # 等待期間 session 被移出、鎖已刪除，改用新的鎖
+                assistant = self._get_session(session_id)
+                self.requests += 1
+                # 並行上限在每次模型呼叫時套用 (見 InflightLimitedLLM)
+                response = await assistant.generate_response(message)
+                break
+
+        await self._evict_overflow()
+        return response
+
+    async def _evict(self, session_id: str):
+        """把 session 寫回磁碟並移出記憶體"""
+        lock = self._session_locks.get(session_id)
+        if lock is None or lock.locked():
+            return  # 正在處理請求，下次再移出
+
+        # 寫回磁碟期間持有 session 鎖，同一 session 的新請求會等寫完才重新載入記憶
+        async with lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                assistant = entry[0]
+                await assistant.wait_background()
+                await asyncio.to_thread(assistant.close)
+                self.evictions += 1
+            # 移出後刪除 session 鎖；正在等待這個鎖的請求會發現鎖已過期並改用新的鎖
+            if self._session_locks.get(session_id) is lock:
+                del self._session_locks[session_id]
+
+    async def _evict_overflow(self):
+        """記憶體中的 session 過多時，移出最久未使用的 session"""
+        for session_id in list(self._sessions)[:max(len(self._sessions) - self.max_sessions, 0)]:
+            await self._evict(session_id)
+
+    async def evict_idle(self):
+        """移出閒置超過 idle_timeout 的 session"""
+        now = time.monotonic()
+        idle = [sid for sid, (_, last_used) in self._sessions.items() if now - last_used > self.idle_timeout]
+        for session_id in idle:
+            await self._evict(session_id)
+
+    async def close(self):
+        """把所有 session 寫回磁碟"""
+        for session_id in list(self._sessions):
+            await self._evict(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_sessions": len(self._sessions),
+            "requests": self.requests,
+            "evictions": self.evictions,
+            "http": connection_stats(),
+        }
+
+
+class ChatServer:
+    """以 asyncio 實作的極簡 HTTP/1.1 伺服器 (每個連線處理一個請求)"""
+
+    def __init__(self, manager: SessionManager, host: str = "127.0.0.1", port: int = 8000):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._evict_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port 為 0 時由系統指派，記下實際使用的 port
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._evict_task = asyncio.create_task(self._evict_loop())
+
+    async def stop(self):
+        if self._evict_task is not None:
+            self._evict_task.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.manager.close()
+
+    async def _evict_loop(self):
+        interval = max(min(self.manager.idle_timeout / 2, 60), 1)
+        while True:
+            await asyncio.sleep(interval)
+            await self.manager.evict_idle()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            status, payload = await self._dispatch(method, path, body)
+        except Exception as e:
+            status, payload = 400, {"error": f"無效的請求: {e}"}
+
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: bytes):
+        if method == "GET" and path == "/stats":
+            return 200, self.manager.stats()
+
+        if method == "POST" and path == "/chat":
+            try:
+                request = json.loads(body or b"{}")
+                response = await self.manager.chat(str(request["session_id"]), str(request["message"]))
+            except (KeyError, ValueError) as e:
+                return 400, {"error": str(e)}
+            except Exception as e:
+                return 500, {"error": f"生成回應失敗: {e}"}
+            return 200, {"response": response}
+
+        return 404, {"error": "找不到路徑"}
+
+
+async def serve(args):
+    # 所有 session 共用一個 keep-alive 連線池，啟動時先在背景載入模型
+    llm = get_llm(args.model or os.getenv("DEFAULT_MODEL", "llama2"),
+                  base_url=args.url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"), warm=True)
+    if args.batch_window > 0:
+        # 經由微批次排程器送出 (同時請求數已由 max_inflight 限制，排程器只會多出收集窗口的等待)
+        llm = batched(llm, window=args.batch_window, max_concurrency=args.max_inflight)
+    manager = SessionManager(llm, sessions_dir=args.sessions_dir, max_sessions=args.max_sessions,
+                             idle_timeout=args.idle_timeout, max_inflight=args.max_inflight)
+    server = ChatServer(manager, host=args.host, port=args.port)
+    await server.start()
+    print(f"個人知識助手伺服器已啟動: http://{server.host}:{server.port}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="個人知識助手 (多用戶伺服器模式)")
+    parser.add_argument("--model", help="使用的 Ollama 模型名稱")
+    parser.add_argument("--url", help="Ollama API URL")
+    parser.add_argument("--host", default="127.0.0.1", help="監聽位址")
+    parser.add_argument("--port", type=int, default=8000, help="監聽埠號")
+    parser.add_argument("--sessions-dir", default="sessions", help="存放各 session 記憶檔的資料夾")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="記憶體中最多保留的 session 數")
+    parser.add_argument("--idle-timeout", type=float, default=600, help="session 閒置多久 (秒) 後寫回磁碟")
+    parser.add_argument("--max-inflight", type=int, default=8, help="同時進行的模型請求上限")
+    parser.add_argument("--batch-window", type=float, default=0.0,
+                        help="經由微批次排程器呼叫模型的收集窗口 (秒)，預設 0 不使用 (請求無法合併，不會比並行呼叫快)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\n伺服器已停止")
+
+
+if __name__ == "__main__":
+    main()
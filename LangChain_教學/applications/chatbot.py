@@ -1,13 +1,18 @@
 import os
+import re
+import sys
 import json
+import time
+import queue
+import asyncio
+import threading
 import argparse
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 # 載入 LangChain 組件
-from langchain_community.llms import Ollama
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.output_parsers import StrOutputParser
@@ -15,31 +20,142 @@ from langchain_core.runnables import RunnablePassthrough
 from langchain.memory import ConversationBufferMemory
 from langchain.tools import tool
 
+# 讓應用可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from llm_common.safe_calc import safe_eval
+from llm_common.batching import batched
+from llm_common.llm_registry import get_llm, connection_stats
+from llm_common.stream_parsers import JsonObjectScanner
+from langchain_core.utils.json import parse_partial_json
+
+from memory_journal import MemoryJournal
+from context_builder import ContextBuilder
+from response_cache import ResponseCache
+from tool_router import RuleBasedRouter
+
 # 載入環境變數
 load_dotenv()
 
+# 意思取決於前文的追問 (「為什麼？」、「繼續」、「那第二個呢？」)：快取鍵不含對話歷史，這類訊息不使用回應快取
+_FOLLOW_UP = re.compile(
+    r"為什麼|為何|繼續|然後呢|還有呢|那|這個|這些|上面|剛才|剛剛|前面|第[一二三四五六七八九十\d]+個|它|他|她|"
+    r"\b(?:why|continue|go\s+on|more|it|its|this|that|these|those|them|they|he|she|above|previous|"
+    r"first|second|third|last)\b",
+    re.IGNORECASE
+)
+_FOLLOW_UP_MAX_CHARS = 6
+
+class FusedAnswerStream:
+    """逐段接收單次呼叫模式的 JSON 輸出，取出 answer 欄位新增的文字
+    
+    只有在 tool 欄位已確定不使用工具後才輸出回答，避免先顯示回答又改用工具結果重新回答。
+    """
+    
+    def __init__(self):
+        self.scanner = JsonObjectScanner()
+        self.sent = ""  # 已輸出的回答
+    
+    @property
+    def done(self) -> bool:
+        return self.scanner.done
+    
+    def feed(self, chunk: str) -> str:
+        """接收一段輸出，返回回答新增的文字 (沒有時為空字串)"""
+        self.scanner.feed(chunk)
+        if self.scanner.start is None:
+            return ""
+        try:
+            partial = parse_partial_json(self.scanner.text if self.scanner.done
+                                         else self.scanner.received[self.scanner.start:])
+        except ValueError:
+            return ""
+        if not isinstance(partial, dict):
+            return ""
+        
+        tool, answer = partial.get("tool"), partial.get("answer")
+        if not isinstance(tool, dict) or tool.get("use_tool") is True or not isinstance(answer, str):
+            return ""
+        return self.advance(answer)
+    
+    def advance(self, answer: str) -> str:
+        """把已輸出的回答推進到 answer，返回新增的部分"""
+        if not self.sent:
+            answer = answer.lstrip()
+        if len(answer) <= len(self.sent) or not answer.startswith(self.sent):
+            return ""
+        new_text = answer[len(self.sent):]
+        self.sent = answer
+        return new_text
+    
+    def result(self) -> Optional[Dict]:
+        """完整的 JSON 物件；輸出不是合法的 JSON 物件時返回 None"""
+        if not self.scanner.done:
+            return None
+        try:
+            data = json.loads(self.scanner.text)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
 class PersonalAssistant:
     """個人知識助手，整合了記憶、工具和個性化功能"""
     
-    def __init__(self, model_name: str = None, base_url: str = None):
-        # 初始化模型
+    def __init__(self, model_name: str = None, base_url: str = None, llm=None,
+                 memory_file: str = "chatbot_memory.json", single_pass: bool = False,
+                 context_tokens: int = 1024, response_cache: Optional[ResponseCache] = None,
+                 quiet: bool = False):
+        # 初始化模型 (可傳入自訂的 llm，例如基準測試用的模擬模型)
         self.model_name = model_name or os.getenv("DEFAULT_MODEL", "llama2")
         self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-        self.llm = Ollama(model=self.model_name, base_url=self.base_url)
+        # 相同設定的模型共用同一個物件與 keep-alive 連線池，並在背景預先載入模型
+        self.llm = llm or get_llm(self.model_name, base_url=self.base_url, warm=True)
+        
+        # 單次呼叫模式：用戶資料、工具判斷與回答在同一次 LLM 呼叫中完成
+        self.single_pass = single_pass
+        
+        # 選用的回應快取：相同 (或相近) 的提示直接返回之前的回應
+        self.response_cache = response_cache
         
         # 初始化記憶
         self.memory = {"history": [], "summary": "", "user_profile": {"name": "", "interests": []}}
-        self.memory_file = "chatbot_memory.json"
+        self.memory_file = memory_file
+        self.journal = MemoryJournal(self.memory_file)
+        self._memory_lock = threading.RLock()
+        
+        # 漸進式摘要：保留最近 summary_keep 條記錄，每次把最舊的 summary_chunk 條併入摘要
+        self.summary_keep = 20
+        self.summary_chunk = 10
+        self._summary_pending = False
+        self._summary_queue = queue.Queue()
+        self._summary_worker = None
+        
+        # 提示中的摘要、用戶資料與對話歷史最多佔用 context_tokens 個 token
+        self.context_builder = ContextBuilder(token_budget=context_tokens)
+        
+        # 串流模式下每輪的延遲記錄 (首個 token 延遲與總延遲，單位: 秒)
+        self.latency_log: List[Dict[str, float]] = []
+        # quiet 時不印出加載記憶的訊息 (伺服器每次重新載入 session 時使用)
+        self.quiet = quiet
         self.load_memory()
         
-        # 初始化工具
+        # 初始化工具；明顯的工具需求先由規則判斷，沒把握時才交給 LLM
         self.setup_tools()
+        self.router = RuleBasedRouter()
         
         # 系統提示
         self.system_prompt = """你是一位有幫助的個人助手，提供友好、準確的回應。
 回答時請考慮用戶的興趣和之前的對話內容。
 如果需要，可以使用可用的工具來幫助回答問題。
 """
+        
+        # 回答用的提示模板與處理鏈只建立一次，動態內容以模板變數傳入；
+        # 固定的系統提示放在最前面，讓 Ollama 可以重用這段前綴的 KV 快取
+        self.answer_prompt = ChatPromptTemplate.from_messages([
+            ("system", self.system_prompt),
+            ("system", "{context}\n\n{tool_result}"),
+            ("human", "{message}")
+        ])
+        self.answer_chain = self.answer_prompt | self.llm | StrOutputParser()
     
     def setup_tools(self):
         """設置可用工具"""
@@ -47,7 +163,7 @@ class PersonalAssistant:
         def calculator(expression: str) -> str:
             """計算數學表達式"""
             try:
-                return str(eval(expression))
+                return str(safe_eval(expression))
             except Exception as e:
                 return f"計算錯誤: {str(e)}"
         
@@ -60,11 +176,12 @@ class PersonalAssistant:
         @tool
         def remember(key: str, value: str = None) -> str:
             """存儲或檢索信息"""
-            if value:
-                self.memory.setdefault("notes", {})[key] = value
-                return f"已記住: {key} = {value}"
-            else:
-                return self.memory.get("notes", {}).get(key, f"沒有找到關於 '{key}' 的記錄")
+            with self._memory_lock:
+                if value:
+                    self.memory.setdefault("notes", {})[key] = value
+                    return f"已記住: {key} = {value}"
+                else:
+                    return self.memory.get("notes", {}).get(key, f"沒有找到關於 '{key}' 的記錄")
         
         self.tools = {
             "calculator": calculator,
@@ -73,27 +190,27 @@ class PersonalAssistant:
         }
     
     def load_memory(self):
-        """從文件加載記憶"""
+        """從快照與日誌加載記憶"""
         try:
-            if Path(self.memory_file).exists():
-                with open(self.memory_file, "r", encoding="utf-8") as f:
-                    self.memory = json.load(f)
-                print(f"已加載記憶，包含 {len(self.memory['history'])} 條對話記錄")
+            memory = self.journal.load()
+            if memory is not None:
+                self.memory = memory
+                if not self.quiet:
+                    print(f"已加載記憶，包含 {len(self.memory['history'])} 條對話記錄")
         except Exception as e:
             print(f"加載記憶失敗: {e}")
     
     def save_memory(self):
-        """將記憶保存到文件"""
+        """將本輪的變動追加到記憶日誌"""
         try:
-            with open(self.memory_file, "w", encoding="utf-8") as f:
-                json.dump(self.memory, f, ensure_ascii=False, indent=2)
+            with self._memory_lock:
+                self.journal.save(self.memory)
         except Exception as e:
             print(f"保存記憶失敗: {e}")
     
-    def update_profile(self, message: str):
-        """更新用戶資料"""
-        # 使用 LLM 更新用戶資料
-        profile_update_prompt = f"""
+    def _profile_prompt(self, message: str) -> str:
+        """建立抽取用戶資料的提示"""
+        return f"""
         分析以下消息，提取用戶的姓名和興趣。如果找到，請以 JSON 格式返回，否則返回空 JSON。
         
         消息: {message}
@@ -101,27 +218,38 @@ class PersonalAssistant:
         僅返回 JSON 格式，例如:
         {{"name": "姓名", "interests": ["興趣1", "興趣2"]}}
         """
-        
+    
+    def update_profile(self, message: str):
+        """更新用戶資料"""
+        # 使用 LLM 更新用戶資料
         try:
-            response = self.llm.invoke(profile_update_prompt)
+            response = self.llm.invoke(self._profile_prompt(message))
             # 嘗試解析 JSON
             try:
-                data = json.loads(response)
-                if data.get("name"):
-                    self.memory["user_profile"]["name"] = data["name"]
-                
-                if data.get("interests"):
-                    for interest in data["interests"]:
-                        if interest not in self.memory["user_profile"]["interests"]:
-                            self.memory["user_profile"]["interests"].append(interest)
+                self._apply_profile_update(json.loads(response))
             except:
                 pass  # 解析失敗則忽略
         except:
             pass  # 模型呼叫失敗則忽略
     
-    def should_use_tool(self, message: str) -> Optional[Dict]:
-        """決定是否使用工具以及使用哪個工具"""
-        tool_select_prompt = f"""
+    def _apply_profile_update(self, data: Dict):
+        """將抽取到的姓名與興趣合併到用戶資料"""
+        if not isinstance(data, dict):
+            return
+        
+        # 背景抽取用戶資料時，另一個執行緒可能正在序列化記憶
+        with self._memory_lock:
+            if data.get("name"):
+                self.memory["user_profile"]["name"] = data["name"]
+            
+            if data.get("interests"):
+                for interest in data["interests"]:
+                    if interest not in self.memory["user_profile"]["interests"]:
+                        self.memory["user_profile"]["interests"].append(interest)
+    
+    def _tool_select_prompt(self, message: str) -> str:
+        """建立工具選擇的提示"""
+        return f"""
         分析以下用戶消息，判斷是否需要使用工具以及使用哪個工具。
         
         可用工具:
@@ -134,41 +262,62 @@ class PersonalAssistant:
         只回答以下 JSON 格式:
         {{"use_tool": true/false, "tool_name": "tool_name", "tool_input": "input"}}
         """
+    
+    def _parse_tool_decision(self, response: str) -> Optional[Dict]:
+        """解析工具選擇的回應，不使用工具時返回 None"""
+        try:
+            data = json.loads(response)
+            if data.get("use_tool") is True:
+                return {
+                    "tool_name": data.get("tool_name", ""),
+                    "tool_input": data.get("tool_input", "")
+                }
+        except:
+            return None  # 解析失敗則不使用工具
+        
+        return None
+    
+    def should_use_tool(self, message: str) -> Optional[Dict]:
+        """決定是否使用工具以及使用哪個工具"""
+        decided, tool_info = self.router.route(message)
+        if decided:
+            return tool_info
         
         try:
-            response = self.llm.invoke(tool_select_prompt)
-            # 嘗試解析回應
-            try:
-                data = json.loads(response)
-                if data.get("use_tool") is True:
-                    return {
-                        "tool_name": data.get("tool_name", ""),
-                        "tool_input": data.get("tool_input", "")
-                    }
-            except:
-                return None  # 解析失敗則不使用工具
+            response = self.llm.invoke(self._tool_select_prompt(message))
         except:
             return None  # 呼叫失敗則不使用工具
         
-        return None
+        # 嘗試解析回應
+        return self._parse_tool_decision(response)
     
     def format_history(self) -> str:
-        """格式化對話歷史"""
-        history = ""
-        # 只使用最近的 10 條對話
-        recent_history = self.memory["history"][-10:] if len(self.memory["history"]) > 10 else self.memory["history"]
-        for message in recent_history:
-            role = "用戶" if message["role"] == "human" else "助手"
-            history += f"{role}: {message['content']}\n"
-        return history
+        """格式化對話歷史 (在 token 預算內放入最近的對話)"""
+        with self._memory_lock:
+            return self.context_builder.format_history(self.memory["history"])
     
-    def generate_response(self, message: str) -> str:
-        """根據用戶輸入生成回應"""
-        # 更新用戶資料
-        self.update_profile(message)
-        
-        # 檢查是否需要使用工具
-        tool_info = self.should_use_tool(message)
+    def build_context(self) -> str:
+        """組合對話摘要、用戶資料與對話歷史，總長度不超過 token 預算"""
+        with self._memory_lock:
+            return self.context_builder.build(self.memory)
+    
+    def _parse_json_response(self, response: str) -> Optional[Dict]:
+        """解析模型輸出的 JSON，容許前後夾雜說明文字"""
+        try:
+            data = json.loads(response)
+        except (TypeError, ValueError):
+            # 模型常在 JSON 前後加上多餘文字，擷取第一個大括號區塊再試一次
+            match = re.search(r"\{.*\}", response or "", re.DOTALL)
+            if not match:
+                return None
+            try:
+                data = json.loads(match.group(0))
+            except ValueError:
+                return None
+        return data if isinstance(data, dict) else None
+    
+    def _run_tool(self, tool_info: Optional[Dict]) -> str:
+        """執行工具並返回結果，沒有工具時返回空字串"""
         tool_result = ""
         
         if tool_info:
@@ -193,65 +342,327 @@ class PersonalAssistant:
                 except Exception as e:
                     tool_result = f"工具執行錯誤: {str(e)}"
         
-        # 構建提示
-        user_name = self.memory["user_profile"]["name"] or "用戶"
-        interests = ", ".join(self.memory["user_profile"]["interests"]) or "未知"
+        return tool_result
+    
+    def _answer_inputs(self, message: str, tool_result: str = "") -> Dict[str, str]:
+        """準備回答處理鏈的模板變數"""
+        return {
+            "context": self.build_context(),
+            "tool_result": f"工具結果: {tool_result}" if tool_result else "",
+            "message": message
+        }
+    
+    def _answer(self, message: str, tool_result: str = "") -> str:
+        """根據用戶資料、對話歷史與工具結果生成最終回答"""
+        return self.answer_chain.invoke(self._answer_inputs(message, tool_result))
+    
+    def _cache_key(self, message: str) -> str:
+        """回應快取的鍵：系統提示、用戶資料與問題
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-            ("system", f"""
-            用戶資料:
-            - 名稱: {user_name}
-            - 興趣: {interests}
-            
-            對話歷史:
-            {self.format_history()}
-            
-            {f"工具結果: {tool_result}" if tool_result else ""}
-            """),
-            ("human", message)
-        ])
+        不包含對話歷史 (每輪都會改變)，否則同一個對話中重複的問題永遠不會命中；
+        意思取決於前文的追問由 _cache_lookup 排除在快取之外。
+        """
+        with self._memory_lock:
+            profile = json.dumps(self.memory["user_profile"], ensure_ascii=False, sort_keys=True)
+        return f"{self.system_prompt}\n用戶資料: {profile}\n{message}"
+    
+    @staticmethod
+    def _depends_on_history(message: str) -> bool:
+        """很短或帶有指代詞的訊息，意思取決於前文"""
+        message = message.strip()
+        return len(message) <= _FOLLOW_UP_MAX_CHARS or bool(_FOLLOW_UP.search(message))
+    
+    def _cache_lookup(self, message: str) -> Tuple[Optional[str], Optional[str]]:
+        """查詢回應快取，返回 (快取鍵, 快取的回應)；依賴前文的追問不查也不寫入快取"""
+        if self.response_cache is None or self._depends_on_history(message):
+            return None, None
         
-        # 生成回應
-        chain = prompt | self.llm | StrOutputParser()
-        response = chain.invoke({})
+        cache_key = self._cache_key(message)
+        return cache_key, self.response_cache.get(cache_key, query=message)
+    
+    def _finish_turn(self, message: str, response: str, cache_key: Optional[str] = None):
+        """將本輪對話寫入記憶並保存
         
-        # 更新記憶
-        self.memory["history"].append({"role": "human", "content": message})
-        self.memory["history"].append({"role": "ai", "content": response})
+        cache_key 不為 None 時，同時把回應寫入回應快取 (使用了工具的回應不應快取)。
+        """
+        if cache_key is not None and self.response_cache is not None:
+            self.response_cache.put(cache_key, response, query=message)
         
-        # 如果對話記錄太長，進行摘要並清理
-        if len(self.memory["history"]) > 100:
-            self._summarize_history()
+        with self._memory_lock:
+            # 更新記憶
+            self.memory["history"].append({"role": "human", "content": message})
+            self.memory["history"].append({"role": "ai", "content": response})
+            
+            # 如果對話記錄太長，把最舊的一小段交給背景摘要
+            self._schedule_summary()
         
         # 保存記憶
         self.save_memory()
+    
+    def generate_response(self, message: str) -> str:
+        """根據用戶輸入生成回應"""
+        cache_key, cached = self._cache_lookup(message)
+        if cached is not None:
+            # 快取命中時完全不呼叫模型
+            self._finish_turn(message, cached)
+            return cached
+        
+        if self.single_pass:
+            return self._generate_single_pass(message, cache_key)
+        return self._generate_multi_step(message, cache_key)
+    
+    def _generate_multi_step(self, message: str, cache_key: Optional[str] = None) -> str:
+        """依序進行用戶資料抽取、工具判斷與回答 (三次 LLM 呼叫)"""
+        # 更新用戶資料
+        self.update_profile(message)
+        
+        # 檢查是否需要使用工具
+        tool_info = self.should_use_tool(message)
+        tool_result = self._run_tool(tool_info)
+        
+        response = self._answer(message, tool_result)
+        self._finish_turn(message, response, None if tool_result else cache_key)
+        
+        return response
+    
+    def stream_response(self, message: str):
+        """根據用戶輸入以串流方式生成回應，逐段產出模型輸出的文字
+        
+        串流結束後才寫入對話記錄並保存記憶，同時記錄本輪的延遲。
+        """
+        start = time.perf_counter()
+        first_token = None
+        
+        cache_key, cached = self._cache_lookup(message)
+        if cached is not None:
+            yield cached
+            self._record_latency(start, None)
+            self._finish_turn(message, cached)
+            return
+        
+        if self.single_pass:
+            stream = self._stream_single_pass(message, cache_key)
+        else:
+            self.update_profile(message)
+            tool_result = self._run_tool(self.should_use_tool(message))
+            stream = self._stream_answer(message, tool_result, cache_key)
+        
+        for chunk in stream:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            yield chunk
+        
+        self._record_latency(start, first_token)
+    
+    def _stream_answer(self, message: str, tool_result: str = "", cache_key: Optional[str] = None):
+        """以串流方式產生回答，結束後寫入對話記錄 (使用了工具的回應不寫入快取)"""
+        chunks = []
+        for chunk in self.answer_chain.stream(self._answer_inputs(message, tool_result)):
+            chunks.append(chunk)
+            yield chunk
+        self._finish_turn(message, "".join(chunks), None if tool_result else cache_key)
+    
+    def _stream_single_pass(self, message: str, cache_key: Optional[str] = None):
+        """單次呼叫模式的串流：邊接收 JSON 邊輸出 answer 欄位，需要工具時再串流工具回答"""
+        fused = FusedAnswerStream()
+        try:
+            stream = self.llm.stream(self._single_pass_prompt(message))
+            try:
+                for chunk in stream:
+                    new_text = fused.feed(chunk)
+                    if new_text:
+                        yield new_text
+                    if fused.done:
+                        break  # JSON 物件已完整，停止生成後面多餘的文字
+            finally:
+                stream.close()
+        except Exception as e:
+            if fused.sent:
+                raise
+            # 呼叫失敗時退回原本的多步驟流程
+            print(f"單次呼叫失敗，改用一般流程: {e}")
+            self.update_profile(message)
+            yield from self._stream_answer(message, self._run_tool(self.should_use_tool(message)), cache_key)
+            return
+        
+        rest, tool_result = self._resolve_single_pass(fused)
+        if rest is None:
+            yield from self._stream_answer(message, tool_result, cache_key)
+            return
+        if rest:
+            yield rest
+        # JSON 在回答中途中斷時，已輸出的部分就是回答，但不寫入快取
+        self._finish_turn(message, fused.sent.strip(), cache_key if fused.done else None)
+    
+    def _resolve_single_pass(self, fused: FusedAnswerStream) -> Tuple[Optional[str], str]:
+        """串流結束後套用單次呼叫的結果，返回 (尚未輸出的回答, 工具結果)
+        
+        回答為 None 時需要再由回答處理鏈生成：模型決定使用工具、沒有給出回答，
+        或輸出不是合法的 JSON (不把原始輸出顯示給用戶)。
+        """
+        data = fused.result()
+        if data is None:
+            return ("", "") if fused.sent else (None, "")
+        
+        tool_result, answer = self._apply_single_pass(data)
+        if tool_result or not answer:
+            return None, tool_result
+        return fused.advance(answer), ""
+    
+    def _record_latency(self, start: float, first_token: Optional[float]):
+        """記錄本輪的首個 token 延遲與總延遲"""
+        total = time.perf_counter() - start
+        self.latency_log.append({
+            "first_token": total if first_token is None else first_token,
+            "total": total
+        })
+    
+    def _single_pass_prompt(self, message: str) -> str:
+        """建立同時完成用戶資料抽取、工具判斷與回答的提示"""
+        return f"""{self.system_prompt}
+        {self.build_context()}
+        
+        可用工具:
+        - calculator: 計算數學表達式
+        - current_time: 獲取當前時間
+        - remember: 存儲或檢索信息 (參數格式: "key" 或 "key:value")
+        
+        用戶消息: {message}
+        
+        請同時完成三件事：從消息中提取用戶的姓名和興趣、判斷是否需要使用工具、回答用戶。
+        只回答以下 JSON 格式 (不需要工具時 answer 填寫完整回答，需要工具時 answer 留空):
+        {{"profile": {{"name": "姓名", "interests": ["興趣1"]}}, "tool": {{"use_tool": true/false, "tool_name": "tool_name", "tool_input": "input"}}, "answer": "回答"}}
+        """
+    
+    def _apply_single_pass(self, data: Dict) -> Tuple[str, Optional[str]]:
+        """套用單次呼叫的 JSON：更新用戶資料並執行工具，返回 (工具結果, 模型直接給出的回答)"""
+        self._apply_profile_update(data.get("profile") or {})
+        
+        tool_info = None
+        tool_data = data.get("tool") or {}
+        if isinstance(tool_data, dict) and tool_data.get("use_tool") is True:
+            tool_info = {
+                "tool_name": tool_data.get("tool_name", ""),
+                "tool_input": str(tool_data.get("tool_input", ""))
+            }
+        
+        answer = data.get("answer")
+        return self._run_tool(tool_info), answer.strip() if isinstance(answer, str) else None
+    
+    def _generate_single_pass(self, message: str, cache_key: Optional[str] = None) -> str:
+        """單次 LLM 呼叫同時完成用戶資料抽取、工具判斷與回答
+        
+        只有在模型決定使用工具時，才會再呼叫一次模型根據工具結果回答；
+        若模型沒有輸出合法的 JSON，則改用一般的回答處理鏈重新回答
+        (原始輸出不顯示給用戶，也不寫入對話記錄或快取)。
+        """
+        try:
+            raw = self.llm.invoke(self._single_pass_prompt(message))
+        except Exception as e:
+            # 呼叫失敗時退回原本的多步驟流程
+            print(f"單次呼叫失敗，改用一般流程: {e}")
+            return self._generate_multi_step(message, cache_key)
         
+        data = self._parse_json_response(raw)
+        if data is None:
+            # JSON 格式錯誤：無法取得資料與工具判斷，以一般的回答處理鏈重新回答
+            response = self._answer(message)
+            self._finish_turn(message, response, cache_key)
+            return response
+        
+        tool_result, answer = self._apply_single_pass(data)
+        if tool_result or not answer:
+            # 需要工具結果 (或模型沒有給出回答) 時才再呼叫一次模型
+            response = self._answer(message, tool_result)
+        else:
+            response = answer
+        
+        self._finish_turn(message, response, None if tool_result else cache_key)
         return response
     
-    def _summarize_history(self):
-        """摘要並清理歷史記錄"""
+    def _schedule_summary(self):
+        """對話記錄超過上限時，排程把最舊的一段對話併入摘要 (需持有記憶鎖)
+        
+        每次只處理 summary_chunk 條記錄，且同時最多一個摘要工作，
+        摘要在背景執行緒進行，不會佔用用戶的回應時間。
+        """
+        history = self.memory["history"]
+        if self._summary_pending or len(history) <= self.summary_keep + self.summary_chunk:
+            return
+        
+        self._summary_pending = True
+        if self._summary_worker is None:
+            self._summary_worker = threading.Thread(target=self._summary_loop, daemon=True)
+            self._summary_worker.start()
+        self._summary_queue.put(history[:self.summary_chunk])
+    
+    def _summary_loop(self):
+        """背景摘要工作執行緒"""
+        while True:
+            chunk = self._summary_queue.get()
+            if chunk is None:
+                # close() 送出的結束訊號
+                self._summary_queue.task_done()
+                break
+            try:
+                self._summarize_history(chunk)
+            finally:
+                self._summary_queue.task_done()
+    
+    def _summarize_history(self, chunk: List[Dict]):
+        """把一段較舊的對話併入摘要，並從歷史記錄中移除"""
         try:
             # 創建摘要
-            history_text = "\n".join([f"{m['role']}: {m['content']}" for m in self.memory["history"]])
+            history_text = "\n".join([f"{m['role']}: {m['content']}" for m in chunk])
             summary_prompt = f"""
-            請總結以下對話的關鍵點和重要信息:
+            目前的對話摘要:
+            {self.memory.get("summary") or "(尚無摘要)"}
+            
+            請把以下較早的對話併入摘要，保留關鍵點和重要信息:
             
             {history_text}
             
-            請提供簡潔的摘要，包含關鍵事實和信息。
+            請只輸出更新後的簡潔摘要，包含關鍵事實和信息。
             """
             
             summary = self.llm.invoke(summary_prompt)
-            self.memory["summary"] = summary
-            
-            # 保留最新的 20 條記錄
-            self.memory["history"] = self.memory["history"][-20:]
         except Exception as e:
             print(f"摘要創建失敗: {e}")
+            with self._memory_lock:
+                self._summary_pending = False
+            return
+        
+        with self._memory_lock:
+            history = self.memory["history"]
+            # 確認這段記錄仍在最前面 (期間可能重新載入了記憶)
+            if len(history) >= len(chunk) and all(a is b for a, b in zip(history, chunk)):
+                self.memory["summary"] = summary
+                del history[:len(chunk)]
+                self.journal.record_trim(len(chunk))
+            
+            self._summary_pending = False
+            # 若累積的記錄仍超過上限，繼續處理下一段
+            self._schedule_summary()
+        
+        self.save_memory()
+    
+    def wait_summary(self):
+        """等待背景摘要工作完成"""
+        self._summary_queue.join()
+    
+    def close(self):
+        """等待背景摘要完成、停止摘要執行緒，並把記憶寫成完整快照"""
+        self.wait_summary()
+        with self._memory_lock:
+            worker, self._summary_worker = self._summary_worker, None
+        if worker is not None:
+            self._summary_queue.put(None)
+            worker.join()
+        with self._memory_lock:
+            self.journal.compact(self.memory)
     
-    def chat(self):
-        """互動式聊天界面"""
+    def chat(self, stream: bool = False):
+        """互動式聊天界面，stream 為 True 時逐段輸出回應"""
         print(f"歡迎使用個人知識助手！(使用 '{self.model_name}' 模型)")
         print("輸入 'exit' 或 'quit' 結束對話")
         
@@ -261,6 +672,14 @@ class PersonalAssistant:
                 if user_input.lower() in ["exit", "quit"]:
                     break
                 
+                if stream:
+                    print("\n助手: ", end="", flush=True)
+                    for chunk in self.stream_response(user_input):
+                        print(chunk, end="", flush=True)
+                    print()
+                    self._print_latency()
+                    continue
+                
                 response = self.generate_response(user_input)
                 print(f"\n助手: {response}")
             
@@ -269,15 +688,249 @@ class PersonalAssistant:
                 break
             except Exception as e:
                 print(f"\n出錯了: {e}")
+        
+        self.wait_summary()
+        self._print_cache_stats()
+
+    def _print_latency(self):
+        """顯示最近一輪的延遲"""
+        if self.latency_log:
+            latency = self.latency_log[-1]
+            print(f"(首個 token: {latency['first_token']:.2f}s，總計: {latency['total']:.2f}s)")
+
+    def _print_cache_stats(self):
+        """顯示回應快取的命中統計與 HTTP 連線重用情況"""
+        if self.response_cache is not None:
+            stats = self.response_cache.stats()
+            print(f"回應快取: 命中 {stats['hits']} 次，近似命中 {stats['near_hits']} 次，"
+                  f"未命中 {stats['misses']} 次 (命中率 {stats['hit_rate']:.0%})")
+        connections = connection_stats()
+        if connections["requests"]:
+            print(f"HTTP 連線: 請求 {connections['requests']} 次，新建連線 {connections['new_connections']} 次，"
+                  f"重用 {connections['reused_connections']} 次")
+
+class AsyncPersonalAssistant(PersonalAssistant):
+    """PersonalAssistant 的非同步版本
+    
+    用戶資料抽取與工具判斷互不相依：工具判斷與回答在關鍵路徑上依序執行，
+    用戶資料抽取則在背景進行，可以在回答返回之後才完成。
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._background_tasks = set()
+    
+    async def aupdate_profile(self, message: str):
+        """非同步更新用戶資料，完成後保存記憶"""
+        try:
+            response = await self.llm.ainvoke(self._profile_prompt(message))
+            try:
+                data = json.loads(response)
+            except:
+                return  # 解析失敗則忽略
+        except:
+            return  # 模型呼叫失敗則忽略
+        
+        # 更新資料需要取得記憶鎖 (可能正被保存中的執行緒持有)，與寫入日誌 (含 fsync) 都在執行緒中進行
+        await asyncio.to_thread(self._apply_profile_update, data)
+        await asyncio.to_thread(self.save_memory)
+    
+    async def ashould_use_tool(self, message: str) -> Optional[Dict]:
+        """非同步決定是否使用工具以及使用哪個工具"""
+        decided, tool_info = self.router.route(message)
+        if decided:
+            return tool_info
+        
+        try:
+            response = await self.llm.ainvoke(self._tool_select_prompt(message))
+        except:
+            return None  # 呼叫失敗則不使用工具
+        
+        return self._parse_tool_decision(response)
+    
+    async def generate_response(self, message: str) -> str:
+        """根據用戶輸入非同步生成回應"""
+        cache_key, cached = self._cache_lookup(message)
+        if cached is not None:
+            await asyncio.to_thread(self._finish_turn, message, cached)
+            return cached
+        
+        if self.single_pass:
+            # 單次呼叫模式本身只有一次 LLM 呼叫，交給執行緒處理即可
+            return await asyncio.to_thread(self._generate_single_pass, message, cache_key)
+        
+        self._start_profile_update(message)
+        
+        tool_info = await self.ashould_use_tool(message)
+        tool_result = self._run_tool(tool_info)
+        
+        response = await self.answer_chain.ainvoke(self._answer_inputs(message, tool_result))
+        # _finish_turn 會寫入記憶日誌 (含 fsync)，在執行緒中進行以免阻塞事件迴圈
+        await asyncio.to_thread(self._finish_turn, message, response, None if tool_result else cache_key)
+        
+        return response
+    
+    async def stream_response(self, message: str):
+        """根據用戶輸入以非同步串流方式生成回應"""
+        start = time.perf_counter()
+        first_token = None
+        
+        cache_key, cached = self._cache_lookup(message)
+        if cached is not None:
+            yield cached
+            self._record_latency(start, None)
+            await asyncio.to_thread(self._finish_turn, message, cached)
+            return
+        
+        if self.single_pass:
+            stream = self._astream_single_pass(message, cache_key)
+        else:
+            stream = self._astream_multi_step(message, cache_key)
+        
+        async for chunk in stream:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            yield chunk
+        
+        self._record_latency(start, first_token)
+    
+    async def _astream_answer(self, message: str, tool_result: str = "", cache_key: Optional[str] = None):
+        """以非同步串流方式產生回答，結束後寫入對話記錄"""
+        chunks = []
+        async for chunk in self.answer_chain.astream(self._answer_inputs(message, tool_result)):
+            chunks.append(chunk)
+            yield chunk
+        # _finish_turn 會寫入記憶日誌 (含 fsync)，在執行緒中進行以免阻塞事件迴圈
+        await asyncio.to_thread(self._finish_turn, message, "".join(chunks), None if tool_result else cache_key)
+    
+    async def _astream_multi_step(self, message: str, cache_key: Optional[str] = None):
+        self._start_profile_update(message)
+        tool_result = self._run_tool(await self.ashould_use_tool(message))
+        async for chunk in self._astream_answer(message, tool_result, cache_key):
+            yield chunk
+    
+    async def _astream_single_pass(self, message: str, cache_key: Optional[str] = None):
+        """單次呼叫模式的非同步串流 (流程同 _stream_single_pass)"""
+        fused = FusedAnswerStream()
+        try:
+            stream = self.llm.astream(self._single_pass_prompt(message))
+            try:
+                async for chunk in stream:
+                    new_text = fused.feed(chunk)
+                    if new_text:
+                        yield new_text
+                    if fused.done:
+                        break
+            finally:
+                await stream.aclose()
+        except Exception as e:
+            if fused.sent:
+                raise
+            print(f"單次呼叫失敗，改用一般流程: {e}")
+            async for chunk in self._astream_multi_step(message, cache_key):
+                yield chunk
+            return
+        
+        # 套用用戶資料與執行工具需要取得記憶鎖，在執行緒中進行，不阻塞事件迴圈
+        rest, tool_result = await asyncio.to_thread(self._resolve_single_pass, fused)
+        if rest is None:
+            async for chunk in self._astream_answer(message, tool_result, cache_key):
+                yield chunk
+            return
+        if rest:
+            yield rest
+        await asyncio.to_thread(self._finish_turn, message, fused.sent.strip(), cache_key if fused.done else None)
+    
+    def _start_profile_update(self, message: str):
+        """在背景執行用戶資料抽取，不阻塞回答"""
+        task = asyncio.create_task(self.aupdate_profile(message))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def wait_background(self):
+        """等待所有背景工作 (例如用戶資料抽取) 完成"""
+        if self._background_tasks:
+            await asyncio.gather(*list(self._background_tasks), return_exceptions=True)
+    
+    async def achat(self, stream: bool = False):
+        """非同步互動式聊天界面，stream 為 True 時逐段輸出回應"""
+        print(f"歡迎使用個人知識助手！(使用 '{self.model_name}' 模型，非同步模式)")
+        print("輸入 'exit' 或 'quit' 結束對話")
+        
+        try:
+            while True:
+                try:
+                    user_input = await asyncio.to_thread(input, "\n你: ")
+                    if user_input.lower() in ["exit", "quit"]:
+                        break
+                    
+                    if stream:
+                        print("\n助手: ", end="", flush=True)
+                        async for chunk in self.stream_response(user_input):
+                            print(chunk, end="", flush=True)
+                        print()
+                        self._print_latency()
+                        continue
+                    
+                    response = await self.generate_response(user_input)
+                    print(f"\n助手: {response}")
+                
+                except (KeyboardInterrupt, EOFError):
+                    print("\n再見！")
+                    break
+                except Exception as e:
+                    print(f"\n出錯了: {e}")
+        finally:
+            await self.wait_background()
+            await asyncio.to_thread(self.wait_summary)
+            self._print_cache_stats()
 
 def main():
     parser = argparse.ArgumentParser(description="個人知識助手")
     parser.add_argument("--model", help="使用的 Ollama 模型名稱")
     parser.add_argument("--url", help="Ollama API URL")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="以單次 LLM 呼叫完成用戶資料、工具判斷與回答")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="使用非同步模式，用戶資料抽取在背景執行")
+    parser.add_argument("--stream", action="store_true",
+                        help="逐段輸出回應，並顯示首個 token 與總延遲")
+    parser.add_argument("--context-tokens", type=int, default=1024,
+                        help="提示中摘要、用戶資料與對話歷史的 token 預算")
+    parser.add_argument("--cache", action="store_true", help="啟用回應快取")
+    parser.add_argument("--cache-size", type=int, default=256, help="回應快取的最大項目數")
+    parser.add_argument("--cache-ttl", type=float, default=3600, help="回應快取的存活時間 (秒)")
+    parser.add_argument("--cache-similarity", type=float,
+                        help="近似命中的相似度門檻 (0~1)，未設定時只有完全相同才命中")
+    parser.add_argument("--batch-window", type=float, default=0.0,
+                        help="經由微批次排程器呼叫模型的收集窗口 (秒)，預設不使用 (請求無法合併，不會比並行呼叫快)")
     args = parser.parse_args()
     
-    assistant = PersonalAssistant(model_name=args.model, base_url=args.url)
-    assistant.chat()
+    llm = None
+    if args.batch_window > 0:
+        llm = batched(get_llm(args.model or os.getenv("DEFAULT_MODEL", "llama2"),
+                              base_url=args.url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+                              warm=True),
+                      window=args.batch_window)
+    
+    response_cache = None
+    if args.cache:
+        response_cache = ResponseCache(max_size=args.cache_size, ttl=args.cache_ttl,
+                                       similarity=args.cache_similarity)
+    
+    if args.use_async:
+        assistant = AsyncPersonalAssistant(model_name=args.model, base_url=args.url, llm=llm,
+                                           single_pass=args.single_pass,
+                                           context_tokens=args.context_tokens,
+                                           response_cache=response_cache)
+        asyncio.run(assistant.achat(stream=args.stream))
+        return
+    
+    assistant = PersonalAssistant(model_name=args.model, base_url=args.url, llm=llm,
+                                  single_pass=args.single_pass,
+                                  context_tokens=args.context_tokens,
+                                  response_cache=response_cache)
+    assistant.chat(stream=args.stream)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,358 @@
+"""個人知識助手的效能基準測試
+
+使用模擬的 LLM (固定延遲、依提示內容回傳固定格式) 取代 Ollama，
+在不需要啟動模型伺服器的情況下比較不同流程的延遲與 LLM 呼叫次數。
+
+用法:
+    python chatbot_benchmark.py [--turns 20] [--latency 0.05]
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from llm_common.stub_llm import StubLLM as BaseStubLLM
+
+from chatbot import PersonalAssistant, AsyncPersonalAssistant
+from chat_server import SessionManager, ChatServer
+from memory_journal import MemoryJournal
+from response_cache import ResponseCache
+from tool_router import RuleBasedRouter
+
+
+class StubLLM(BaseStubLLM):
+    """依提示類型 (融合 JSON、用戶資料、工具選擇、一般回答) 回傳對應內容的模擬 LLM"""
+
+    def respond(self, prompt: str) -> str:
+        if '"answer"' in prompt:
+            return json.dumps({
+                "profile": {"name": "小明", "interests": ["Python"]},
+                "tool": {"use_tool": False},
+                "answer": "這是模擬的回答。"
+            }, ensure_ascii=False)
+        if "提取用戶的姓名和興趣" in prompt:
+            return '{"name": "小明", "interests": ["Python"]}'
+        if "判斷是否需要使用工具" in prompt:
+            return '{"use_tool": false}'
+        return "這是模擬的回答，" * 10
+
+
+def _make_assistant(workdir: Path, latency: float, cls=PersonalAssistant, **kwargs):
+    llm = StubLLM(latency=latency)
+    memory_file = workdir / f"memory_{time.perf_counter_ns()}.json"
+    return cls(llm=llm, memory_file=str(memory_file), **kwargs)
+
+
+def bench_single_pass(turns: int, latency: float):
+    """比較三步驟流程與單次呼叫流程的每輪延遲"""
+    print("\n===== 三步驟流程 vs 單次呼叫流程 =====")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, single_pass in [("三步驟", False), ("單次呼叫", True)]:
+            assistant = _make_assistant(Path(tmp), latency, single_pass=single_pass)
+
+            start = time.perf_counter()
+            for i in range(turns):
+                assistant.generate_response(f"你好，我叫小明，我喜歡 Python。第 {i} 個問題")
+            elapsed = time.perf_counter() - start
+
+            print(f"{label:<8} 平均每輪 {elapsed / turns * 1000:7.1f} ms，"
+                  f"每輪 LLM 呼叫 {assistant.llm.calls / turns:.1f} 次")
+
+
+def bench_async(turns: int, latency: float):
+    """比較同步流程與非同步流程 (用戶資料抽取在背景執行) 的每輪延遲"""
+    print("\n===== 同步流程 vs 非同步流程 =====")
+
+    async def run(assistant):
+        start = time.perf_counter()
+        for i in range(turns):
+            await assistant.generate_response(f"我叫小明，第 {i} 個問題")
+        elapsed = time.perf_counter() - start
+        await assistant.wait_background()
+        return elapsed
+
+    with tempfile.TemporaryDirectory() as tmp:
+        assistant = _make_assistant(Path(tmp), latency)
+        start = time.perf_counter()
+        for i in range(turns):
+            assistant.generate_response(f"我叫小明，第 {i} 個問題")
+        elapsed = time.perf_counter() - start
+        print(f"{'同步':<8} 平均每輪 {elapsed / turns * 1000:7.1f} ms")
+
+        assistant = _make_assistant(Path(tmp), latency, cls=AsyncPersonalAssistant)
+        elapsed = asyncio.run(run(assistant))
+        print(f"{'非同步':<8} 平均每輪 {elapsed / turns * 1000:7.1f} ms，"
+              f"用戶資料: {assistant.memory['user_profile']}")
+
+
+def bench_stream(turns: int, latency: float, token_latency: float = 0.005):
+    """比較一般模式與串流模式下，用戶看到第一個字之前的等待時間"""
+    print("\n===== 一般輸出 vs 串流輸出 =====")
+    with tempfile.TemporaryDirectory() as tmp:
+        assistant = _make_assistant(Path(tmp), latency)
+        assistant.llm.token_latency = token_latency
+        start = time.perf_counter()
+        for i in range(turns):
+            assistant.generate_response(f"第 {i} 個問題")
+        blocking = (time.perf_counter() - start) / turns
+        print(f"{'一般':<8} 首個字 {blocking * 1000:7.1f} ms，總計 {blocking * 1000:7.1f} ms")
+
+        for label, single_pass in [("串流", False), ("單次呼叫串流", True)]:
+            assistant = _make_assistant(Path(tmp), latency, single_pass=single_pass)
+            assistant.llm.token_latency = token_latency
+            for i in range(turns):
+                for _ in assistant.stream_response(f"第 {i} 個問題"):
+                    pass
+            first = sum(t["first_token"] for t in assistant.latency_log) / turns
+            total = sum(t["total"] for t in assistant.latency_log) / turns
+            print(f"{label:<8} 首個字 {first * 1000:7.1f} ms，總計 {total * 1000:7.1f} ms，"
+                  f"LLM 呼叫 {assistant.llm.calls / turns:.1f} 次/輪")
+
+
+def bench_summary(turns: int, latency: float):
+    """檢查漸進式摘要不會讓任何一輪出現延遲尖峰"""
+    print("\n===== 漸進式背景摘要 =====")
+    with tempfile.TemporaryDirectory() as tmp:
+        assistant = _make_assistant(Path(tmp), latency, single_pass=True)
+        durations = []
+        for i in range(turns):
+            start = time.perf_counter()
+            assistant.generate_response(f"第 {i} 個問題")
+            durations.append(time.perf_counter() - start)
+        assistant.wait_summary()
+
+        durations.sort()
+        print(f"{turns} 輪對話，中位數 {durations[len(durations) // 2] * 1000:.1f} ms，"
+              f"最慢 {durations[-1] * 1000:.1f} ms，"
+              f"剩餘記錄 {len(assistant.memory['history'])} 條")
+
+
+def bench_response_cache(turns: int, latency: float):
+    """重複提問時，比較不使用快取、完全相同命中與近似命中的延遲"""
+    print("\n===== 回應快取 (重複提問) =====")
+    questions = ["什麼是人工智慧？", "Python 有哪些特點？", "什麼是人工智慧呢?"]
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, cache in [("不使用快取", None),
+                             ("完全相同", ResponseCache()),
+                             ("近似命中", ResponseCache(similarity=0.6))]:
+            # 同一個對話中重複提問 (對話歷史每輪都不同，快取鍵不包含歷史)
+            assistant = _make_assistant(Path(tmp), latency, single_pass=True, response_cache=cache)
+            start = time.perf_counter()
+            for i in range(turns):
+                assistant.generate_response(questions[i % len(questions)])
+            elapsed = time.perf_counter() - start
+            calls = assistant.llm.calls
+
+            hit_rate = cache.stats()["hit_rate"] if cache else 0.0
+            print(f"{label:<8} 平均每輪 {elapsed / turns * 1000:7.1f} ms，"
+                  f"LLM 呼叫 {calls} 次，命中率 {hit_rate:.0%}")
+
+
+# 已標註的訊息：(訊息, 正確的工具名稱，None 表示不需要工具)
+ROUTER_CORPUS = [
+    ("12*7", "calculator"),
+    ("計算 125 除以 8", "calculator"),
+    ("幫我算一下 (345 + 678) / 3", "calculator"),
+    ("23 * 7 + 15 等於多少？", "calculator"),
+    ("What is 15% of 80?", "calculator"),
+    ("what's 2^10", "calculator"),
+    ("calculate 3.5 * 4", "calculator"),
+    ("help me calculate twelve times seven", "calculator"),
+    ("現在幾點？", "current_time"),
+    ("現在的時間是什麼", "current_time"),
+    ("今天幾號", "current_time"),
+    ("what time is it", "current_time"),
+    ("What's the date today?", "current_time"),
+    ("今天星期幾？", "current_time"),
+    ("What time zone is Taipei in?", None),
+    ("今天幾號買的 3 本書", None),
+    ("明天幾點開會比較好？", None),
+    ("記住我的生日是 5 月 3 日", "remember"),
+    ("請記住 wifi 密碼: abc123", "remember"),
+    ("remember that my dog is Lucky", "remember"),
+    ("你還記得我的生日嗎？", "remember"),
+    ("Please remember that my locker is 42", "remember"),
+    ("I cannot remember if the store is open today", None),
+    ("Do you remember that my name is Bob?", "remember"),
+    ("我總是記住他是好人", None),
+    ("我的 wifi 密碼是什麼？", "remember"),
+    ("What is my dog called?", "remember"),
+    ("你好", None),
+    ("謝謝", None),
+    ("hello", None),
+    ("Python 是什麼編程語言？", None),
+    ("解釋量子計算的基本原理", None),
+    ("推薦幾本機器學習的入門書", None),
+    ("How do I read a CSV file in Python?", None),
+    ("我今年 25 歲，想學程式設計", None),
+    ("iPhone 15 和 14 差在哪裡", None),
+    ("寫一首關於秋天的詩", None),
+]
+
+
+def bench_router():
+    """在標註過的訊息上評估規則路由：省下的 LLM 呼叫與判定準確率"""
+    print("\n===== 規則式工具路由 =====")
+    router = RuleBasedRouter()
+    decided = correct = 0
+    start = time.perf_counter()
+    for message, expected in ROUTER_CORPUS:
+        is_decided, tool_info = router.route(message)
+        if is_decided:
+            decided += 1
+            predicted = tool_info["tool_name"] if tool_info else None
+            correct += predicted == expected
+    elapsed = (time.perf_counter() - start) / len(ROUTER_CORPUS)
+
+    total = len(ROUTER_CORPUS)
+    print(f"共 {total} 則訊息，規則判定 {decided} 則 (省下 {decided / total:.0%} 的 LLM 工具選擇呼叫)，"
+          f"交給 LLM {total - decided} 則")
+    print(f"規則判定準確率 {correct / decided:.0%}，平均每則 {elapsed * 1e6:.1f} µs")
+    print(f"各路由次數: {router.stats()}")
+
+
+def bench_prompt_overhead(rounds: int = 500):
+    """比較每輪重新建立提示模板與處理鏈，以及重用預先建立的處理鏈的額外開銷"""
+    print("\n===== 每輪建立處理鏈 vs 重用處理鏈 (模擬 LLM 無延遲) =====")
+    with tempfile.TemporaryDirectory() as tmp:
+        assistant = _make_assistant(Path(tmp), 0.0)
+        message, context = "今天天氣如何？", assistant.build_context()
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            # 原本的做法：動態內容直接寫進系統訊息，每輪解析模板並組合 Runnable
+            prompt = ChatPromptTemplate.from_messages([
+                ("system", assistant.system_prompt),
+                ("system", f"""
+                {context}
+                """),
+                ("human", message)
+            ])
+            (prompt | assistant.llm | StrOutputParser()).invoke({})
+        rebuild_ms = (time.perf_counter() - start) / rounds * 1000
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            assistant.answer_chain.invoke({"context": context, "tool_result": "", "message": message})
+        cached_ms = (time.perf_counter() - start) / rounds * 1000
+
+        print(f"{'每輪建立':<8} {rebuild_ms:.3f} ms/輪")
+        print(f"{'重用處理鏈':<8} {cached_ms:.3f} ms/輪")
+
+
+async def _post_chat(port: int, session_id: str, message: str) -> dict:
+    """以原始 HTTP 請求呼叫伺服器的 /chat"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps({"session_id": session_id, "message": message}).encode("utf-8")
+    writer.write(b"POST /chat HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    return json.loads(raw.split(b"\r\n\r\n", 1)[1])
+
+
+def bench_server(sessions: int, turns: int, latency: float, max_inflight: int = 16):
+    """多用戶伺服器負載測試：N 個 session 同時對話，統計請求延遲的 p50 與 p99"""
+    print(f"\n===== 伺服器負載測試 ({sessions} 個 session，每個 {turns} 輪，"
+          f"同時模型請求上限 {max_inflight}) =====")
+
+    async def run(tmp: str):
+        llm = StubLLM(latency=latency)
+        manager = SessionManager(llm, sessions_dir=tmp, max_sessions=max(sessions // 2, 1),
+                                 max_inflight=max_inflight)
+        server = ChatServer(manager, port=0)
+        await server.start()
+
+        latencies = []
+
+        async def client(index: int):
+            for turn in range(turns):
+                start = time.perf_counter()
+                result = await _post_chat(server.port, f"user{index}", f"第 {turn} 個問題")
+                assert "response" in result, result
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(i) for i in range(sessions)))
+        elapsed = time.perf_counter() - start
+        stats = manager.stats()
+        await server.stop()
+        return latencies, elapsed, stats
+
+    with tempfile.TemporaryDirectory() as tmp:
+        latencies, elapsed, stats = asyncio.run(run(tmp))
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+    print(f"共 {len(latencies)} 個請求，{len(latencies) / elapsed:.1f} 請求/秒，"
+          f"p50 {p50 * 1000:.1f} ms，p99 {p99 * 1000:.1f} ms")
+    print(f"伺服器統計: {stats}")
+
+
+def bench_journal(rounds: int = 50):
+    """比較每輪完整改寫 JSON 與追加日誌的寫入成本 (隨對話記錄長度變化)"""
+    print("\n===== 完整改寫 vs 追加日誌 =====")
+    print(f"{'記錄條數':<8}{'完整改寫 ms':>12}{'位元組':>10}{'追加日誌 ms':>12}{'位元組':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [10, 100, 1000]:
+            memory = {
+                "history": [{"role": "human" if i % 2 == 0 else "ai", "content": f"第 {i} 條訊息，" * 5}
+                            for i in range(size)],
+                "summary": "",
+                "user_profile": {"name": "小明", "interests": ["Python"]},
+            }
+
+            # 原本的做法：每輪重新序列化整個記憶
+            full_path = Path(tmp) / f"full_{size}.json"
+            start = time.perf_counter()
+            for i in range(rounds):
+                with open(full_path, "w", encoding="utf-8") as f:
+                    json.dump(memory, f, ensure_ascii=False, indent=2)
+            full_ms = (time.perf_counter() - start) / rounds * 1000
+            full_bytes = full_path.stat().st_size
+
+            # 日誌做法：每輪只追加新的兩條記錄 (關閉 fsync 以便公平比較)
+            journal = MemoryJournal(str(Path(tmp) / f"journal_{size}.json"),
+                                    compact_every=rounds + 1, fsync=False)
+            journal.compact(memory)
+            start = time.perf_counter()
+            for i in range(rounds):
+                memory["history"].append({"role": "human", "content": f"新問題 {i}"})
+                memory["history"].append({"role": "ai", "content": f"新回答 {i}"})
+                journal.save(memory)
+            journal_ms = (time.perf_counter() - start) / rounds * 1000
+            journal_bytes = journal.journal_path.stat().st_size / rounds
+
+            print(f"{size:<12}{full_ms:>12.3f}{full_bytes:>12}{journal_ms:>14.3f}{journal_bytes:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="個人知識助手效能基準測試")
+    parser.add_argument("--turns", type=int, default=20, help="每種模式執行的對話輪數")
+    parser.add_argument("--latency", type=float, default=0.05, help="模擬 LLM 每次呼叫的延遲 (秒)")
+    parser.add_argument("--sessions", type=int, default=50, help="伺服器負載測試的同時 session 數")
+    args = parser.parse_args()
+
+    bench_single_pass(args.turns, args.latency)
+    bench_async(args.turns, args.latency)
+    bench_stream(args.turns, args.latency)
+    bench_summary(max(args.turns, 120), args.latency)
+    bench_response_cache(args.turns, args.latency)
+    bench_router()
+    bench_prompt_overhead()
+    bench_server(args.sessions, 5, args.latency)
+    bench_journal()
+
+
+if __name__ == "__main__":
+    main()
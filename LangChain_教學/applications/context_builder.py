@@ -0,0 +1,86 @@
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_common.tokens import estimate_tokens
+
+
+@lru_cache(maxsize=4096)
+def _format_message(role: str, content: str) -> Tuple[str, int]:
+    """格式化單條對話記錄並估算 token 數，結果會被快取"""
+    line = f"{'用戶' if role == 'human' else '助手'}: {content}\n"
+    return line, estimate_tokens(line)
+
+
+class ContextBuilder:
+    """在 token 預算內組合對話摘要、用戶資料與最近的對話記錄
+
+    摘要與用戶資料優先放入 (摘要最多佔預算的一半，過長時保留較新的部分)，
+    剩餘預算由新到舊放入對話記錄。摘要與用戶資料組成的前段只在兩者變動時重新組合
+    (跨輪重用)；對話記錄每輪都會改變，每次重新組合，單條記錄的格式化結果另有快取。
+    """
+
+    def __init__(self, token_budget: int = 1024):
+        self.token_budget = token_budget
+        self._prefix_key: Optional[tuple] = None
+        self._prefix: Tuple[str, str, int] = ("", "", 0)
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+
+    def build(self, memory: Dict[str, Any]) -> str:
+        """返回放入提示的上下文文字"""
+        history = memory.get("history", [])
+        summary_text, profile_text, budget = self._build_prefix(
+            memory.get("summary") or "", memory.get("user_profile", {}))
+        history_text = self.format_history(history, budget)
+        return f"{summary_text}\n{profile_text}\n對話歷史:\n{history_text}"
+
+    def _build_prefix(self, summary: str, profile: Dict[str, Any]) -> Tuple[str, str, int]:
+        """返回 (摘要文字, 用戶資料文字, 留給對話記錄的預算)；摘要與用戶資料沒有變動時直接重用"""
+        key = (summary, json.dumps(profile, ensure_ascii=False, sort_keys=True), self.token_budget)
+        if key == self._prefix_key:
+            self.prefix_hits += 1
+            return self._prefix
+        self.prefix_misses += 1
+
+        user_name = profile.get("name") or "用戶"
+        interests = ", ".join(profile.get("interests", [])) or "未知"
+        profile_text = f"用戶資料:\n- 名稱: {user_name}\n- 興趣: {interests}\n"
+
+        budget = self.token_budget - estimate_tokens(profile_text)
+        summary_text = ""
+        if summary:
+            summary = self._truncate(summary, max(budget // 2, 0))
+            summary_text = f"對話摘要:\n{summary}\n"
+            budget -= estimate_tokens(summary_text)
+
+        self._prefix_key, self._prefix = key, (summary_text, profile_text, budget)
+        return self._prefix
+
+    def format_history(self, history: List[Dict[str, str]], budget: Optional[int] = None) -> str:
+        """由新到舊放入對話記錄，直到用完 token 預算"""
+        if budget is None:
+            budget = self.token_budget
+
+        lines = []
+        for message in reversed(history):
+            line, tokens = _format_message(message["role"], message["content"])
+            if tokens > budget:
+                break
+            lines.append(line)
+            budget -= tokens
+        return "".join(reversed(lines))
+
+    def _truncate(self, text: str, budget: int) -> str:
+        """文字超出預算時只保留結尾 (較新的) 部分"""
+        if estimate_tokens(text) <= budget:
+            return text
+        # 二分搜尋可以保留的最多字元數
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if estimate_tokens(text[-mid:]) <= budget:
+                low = mid
+            else:
+                high = mid - 1
+        return text[-low:] if low else ""
@@ -0,0 +1,164 @@
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class MemoryJournal:
+    """追加式的記憶存儲
+
+    記憶由兩個檔案組成：
+    - 快照檔 (例如 chatbot_memory.json)：完整的記憶內容
+    - 日誌檔 (例如 chatbot_memory.json.journal)：每輪對話追加一行 JSON，
+      只記錄新增的對話記錄、從前端移除的記錄條數與有變動的欄位
+
+    每輪寫入的資料量與對話記錄長度無關；追加失敗 (例如寫到一半當機)
+    最多只會損失最後一行，載入時會略過並從檔案中截掉。日誌累積到 compact_every 筆時，
+    會把目前的記憶寫成新的快照 (先寫暫存檔再原子替換) 並清空日誌。
+    快照與日誌記錄都帶有世代編號，重播時只套用與快照同一世代的記錄，
+    因此壓縮過程中任何時間點中斷都不會重複套用舊日誌。
+    """
+
+    GENERATION_KEY = "_journal_generation"
+
+    def __init__(self, snapshot_path: str, compact_every: int = 50, fsync: bool = True):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = self.snapshot_path.with_name(self.snapshot_path.name + ".journal")
+        self.compact_every = compact_every
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._generation = 0       # 目前快照的世代編號
+        self._records = 0          # 日誌中的記錄筆數
+        self._persisted_len = 0    # 已寫入的對話記錄條數
+        self._trimmed = 0          # 尚未寫入的前端移除條數
+        self._fields: Dict[str, str] = {}  # 已寫入的其他欄位 (序列化後的字串)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """讀取快照並重播日誌，沒有任何存檔時返回 None"""
+        memory = None
+        generation = 0
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                memory = json.load(f)
+            generation = memory.pop(self.GENERATION_KEY, 0)
+
+        records = 0
+        if self.journal_path.exists():
+            valid_end = 0  # 最後一行完整記錄結尾的位置
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("缺少換行")
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # 最後一行寫到一半，之後的內容不可信
+                    valid_end += len(line)
+                    if record.get("gen", 0) != generation:
+                        continue  # 壓縮前留下的舊日誌，內容已在快照中
+                    if memory is None:
+                        memory = {"history": []}
+                    self._replay(memory, record)
+                    records += 1
+                size = f.seek(0, os.SEEK_END)
+
+            if valid_end < size:
+                # 截掉寫到一半的尾端，否則下一次追加會接在殘缺的行後面，之後的記錄載入時都會被略過
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(valid_end)
+                    if self.fsync:
+                        os.fsync(f.fileno())
+
+        with self._lock:
+            self._generation = generation
+            self._records = records
+            if memory is not None:
+                self._mark_persisted(memory)
+        return memory
+
+    def _replay(self, memory: Dict[str, Any], record: Dict[str, Any]):
+        """將一筆日誌記錄套用到記憶"""
+        history = memory.setdefault("history", [])
+        del history[:record.get("trim", 0)]
+        history.extend(record.get("history", []))
+        for key, value in record.get("fields", {}).items():
+            memory[key] = value
+
+    def record_trim(self, count: int):
+        """記錄對話記錄最前面被移除了 count 條 (例如已併入摘要)"""
+        with self._lock:
+            self._trimmed += count
+
+    def _mark_persisted(self, memory: Dict[str, Any]):
+        self._persisted_len = len(memory.get("history", []))
+        self._trimmed = 0
+        self._fields = {
+            key: json.dumps(value, ensure_ascii=False, sort_keys=True)
+            for key, value in memory.items() if key != "history"
+        }
+
+    def save(self, memory: Dict[str, Any]):
+        """寫入自上次保存以來的變動"""
+        with self._lock:
+            history = memory.get("history", [])
+            persisted_len = self._persisted_len - self._trimmed
+            if len(history) < persisted_len or self._records >= self.compact_every:
+                # 對話記錄被截短 (例如摘要後清理) 或日誌太長時改寫快照
+                self._compact(memory)
+                return
+
+            fields, dumped_fields = {}, {}
+            for key, value in memory.items():
+                if key == "history":
+                    continue
+                dumped = json.dumps(value, ensure_ascii=False, sort_keys=True)
+                if self._fields.get(key) != dumped:
+                    fields[key] = value
+                    dumped_fields[key] = dumped
+
+            new_history = history[persisted_len:]
+            if not new_history and not fields and not self._trimmed:
+                return
+
+            record = {"gen": self._generation, "history": new_history, "fields": fields}
+            if self._trimmed:
+                record["trim"] = self._trimmed
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+
+            self._persisted_len = len(history)
+            self._trimmed = 0
+            self._fields.update(dumped_fields)
+            self._records += 1
+
+    def compact(self, memory: Dict[str, Any]):
+        """把完整記憶寫成新的快照並清空日誌"""
+        with self._lock:
+            self._compact(memory)
+
+    def _compact(self, memory: Dict[str, Any]):
+        generation = self._generation + 1
+        snapshot = dict(memory)
+        snapshot[self.GENERATION_KEY] = generation
+
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        # 快照已包含所有內容，舊日誌的世代編號已過期，刪除只是為了節省空間
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+
+        self._generation = generation
+        self._records = 0
+        self._mark_persisted(memory)
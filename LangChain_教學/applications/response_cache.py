@@ -0,0 +1,119 @@
+import re
+import time
+import unicodedata
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+
+def normalize_prompt(text: str) -> str:
+    """正規化提示：統一全形半形、大小寫並合併空白，讓排版不同的相同問題得到相同的鍵"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def _ngrams(text: str, n: int) -> FrozenSet[str]:
+    """字元 n-gram 集合 (中文不需要分詞也能比較相似度)"""
+    if len(text) <= n:
+        return frozenset([text])
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+class ResponseCache:
+    """LLM 回應快取，依 LRU 與存活時間 (TTL) 淘汰
+
+    預設只有正規化後完全相同的提示才會命中；similarity 設為 0~1 之間的門檻時，
+    若查詢時提供了 query (提示中用戶問題的部分)，會在提示其餘部分完全相同的項目中，
+    以用戶問題的字元 n-gram Jaccard 相似度尋找近似的問題。
+    """
+
+    def __init__(self, max_size: int = 256, ttl: Optional[float] = 3600,
+                 similarity: Optional[float] = None, ngram: int = 3):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.ngram = ngram
+
+        self._lock = threading.Lock()
+        # 鍵 -> (回應, 寫入時間, 提示中問題以外的部分, 問題的 n-gram 集合)
+        self._entries: "OrderedDict[str, Tuple[str, float, str, Optional[FrozenSet[str]]]]" = OrderedDict()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def _scope(self, key: str, query: Optional[str]) -> Tuple[str, Optional[FrozenSet[str]]]:
+        """拆出提示中問題以外的部分，以及問題的 n-gram 集合"""
+        if self.similarity is None or not query:
+            return key, None
+        query = normalize_prompt(query)
+        return key.replace(query, "", 1), _ngrams(query, self.ngram)
+
+    def get(self, prompt: str, query: Optional[str] = None) -> Optional[str]:
+        """查詢快取，未命中時返回 None"""
+        key = normalize_prompt(prompt)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            scope, grams = self._scope(key, query)
+            if grams is not None:
+                match = self._find_similar(scope, grams, now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.near_hits += 1
+                    return self._entries[match][0]
+
+            self.misses += 1
+            return None
+
+    def put(self, prompt: str, response: str, query: Optional[str] = None):
+        """寫入快取，超過容量時淘汰最久未使用的項目"""
+        key = normalize_prompt(prompt)
+        scope, grams = self._scope(key, query)
+
+        with self._lock:
+            self._entries[key] = (response, time.monotonic(), scope, grams)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _expired(self, entry: tuple, now: float) -> bool:
+        """項目是否已超過存活時間 (過期項目在被查詢到時才移除)"""
+        return self.ttl is not None and now - entry[1] > self.ttl
+
+    def _find_similar(self, scope: str, grams: FrozenSet[str], now: float) -> Optional[str]:
+        """在提示其餘部分相同的項目中，找出問題相似度最高且超過門檻的項目"""
+        best_key, best_score = None, self.similarity
+        for other_key, entry in self._entries.items():
+            other_scope, other_grams = entry[2], entry[3]
+            if other_grams is None or other_scope != scope or self._expired(entry, now):
+                continue
+            score = len(grams & other_grams) / len(grams | other_grams)
+            if score >= best_score:
+                best_key, best_score = other_key, score
+        return best_key
+
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """返回命中與未命中次數"""
+        with self._lock:
+            total = self.hits + self.near_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.near_hits) / total if total else 0.0,
+            }
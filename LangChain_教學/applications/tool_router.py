@@ -0,0 +1,120 @@
+import re
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+# 算式：至少包含一個「數字 運算子 數字」的片段
+_EXPRESSION = re.compile(r"[\d(][\d\s.+\-*/×÷^%()]*[+\-*/×÷^%][\s(]*[\d.][\d\s.+\-*/×÷^%()]*")
+# 數字之間的文字運算子，例如「125 除以 8」、「3 times 4」
+_WORD_OPERATORS = {
+    "除以": "/", "乘以": "*", "乘": "*", "加上": "+", "加": "+", "減去": "-", "減": "-",
+    "divided by": "/", "multiplied by": "*", "times": "*", "plus": "+", "minus": "-",
+}
+_WORD_OPERATOR_PATTERN = re.compile(
+    r"(?<=\d)\s*(" + "|".join(sorted(_WORD_OPERATORS, key=len, reverse=True)) + r")\s*(?=[\d(])",
+    re.IGNORECASE
+)
+_ARITHMETIC_WORDS = re.compile(
+    r"計算|算一下|算算|等於|多少|結果|calculate|compute|what\s+is|what's|equals?|how\s+much",
+    re.IGNORECASE
+)
+
+# 只比對整句就是在問目前時間或日期的問法；「明天幾點開會」、「what time zone」等交給 LLM
+_TIME_PATTERNS = re.compile(
+    r"^(?:請問)?(?:現在|目前)?(?:是)?幾點(?:了|鐘)?\W*$|"
+    r"^(?:請問)?(?:現在|目前)的?時間(?:是)?(?:什麼|多少)?\W*$|"
+    r"^(?:請問)?(?:今天|今日)(?:是)?(?:幾月)?(?:幾號|星期幾|禮拜幾|的?日期(?:是)?(?:什麼)?)\W*$|"
+    r"^what\s+time\s+is\s+it(?:\s+now)?\W*$|"
+    r"^what(?:'s|\s+is)\s+the\s+(?:current\s+)?(?:time|date)(?:\s+(?:now|today))?\W*$|"
+    r"^what\s+(?:day|date)\s+is\s+(?:it|today)\W*$|"
+    r"^(?:what(?:'s|\s+is)\s+)?today'?s\s+date\W*$",
+    re.IGNORECASE
+)
+
+# 以祈使句開頭的「記住 key 是 value」/「remember that key is value」；
+# 「我總是記住…」、「I cannot remember if…」等不是存入要求，交給 LLM
+_REMEMBER_STORE = re.compile(
+    r"^(?:請)?(?:幫我)?記住\s*[:：]?\s*(?:我的)?(.+?)\s*(?:是|為|=|:|：)\s*(.+?)[。.!！]?$|"
+    r"^(?:please\s+)?remember\s+(?:that\s+)?(?:my\s+)?(.+?)\s+(?:is|=|:)\s+(.+?)[.!]?$",
+    re.IGNORECASE
+)
+_MEMORY_WORDS = re.compile(r"記住|記得|記下|記錄|忘記|remember|recall|note|forget", re.IGNORECASE)
+# 與計算或時間工具相關的字眼：出現但規則無法確定時交給 LLM 判斷
+_TOOL_WORDS = re.compile(
+    r"計算|算一下|算算|等於|乘|除以|加上|減去|平方|次方|時間|時區|幾點|幾號|日期|星期|禮拜|"
+    r"\b(?:calculat\w*|compute|times|plus|minus|divided|multipl\w*|sum|squared?|percent|"
+    r"time|date|today|clock)\b",
+    re.IGNORECASE
+)
+
+# 問句：可能在詢問記住的筆記 (只有 remember 工具讀得到)，不能直接判定為不需要工具
+_QUESTION = re.compile(
+    r"[?？]\s*$|什麼|甚麼|哪|誰|嗎|呢|\b(?:what|who|where|which|when|whose|how)\b",
+    re.IGNORECASE
+)
+
+_GREETINGS = re.compile(
+    r"^(你好|您好|嗨|哈囉|早安|午安|晚安|謝謝|感謝|再見|hi|hello|hey|thanks|thank\s+you|bye)\W*$",
+    re.IGNORECASE
+)
+
+
+class RuleBasedRouter:
+    """以規則判斷明顯的工具需求，省去一次 LLM 工具選擇呼叫
+
+    route() 返回 (是否已判定, 工具資訊)：
+    - (True, {...})  明確需要某個工具
+    - (True, None)   明確不需要工具
+    - (False, None)  沒有把握，交給 LLM 判斷
+    每種判定結果的次數記錄在 counters 中。
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+
+    def route(self, message: str) -> Tuple[bool, Optional[Dict]]:
+        decided, tool_info, route = self._classify(message.strip())
+        self.counters[route] += 1
+        return decided, tool_info
+
+    def _classify(self, message: str) -> Tuple[bool, Optional[Dict], str]:
+        if not message or _GREETINGS.match(message):
+            return True, None, "no_tool"
+
+        if _TIME_PATTERNS.search(message):
+            return True, {"tool_name": "current_time", "tool_input": ""}, "current_time"
+
+        # 問句 (「Do you remember that my name is Bob?」) 不是存入要求
+        match = None if re.search(r"[?？]\s*$", message) else _REMEMBER_STORE.match(message)
+        if match:
+            key = (match.group(1) or match.group(3)).strip()
+            value = (match.group(2) or match.group(4)).strip()
+            return True, {"tool_name": "remember", "tool_input": f"{key}:{value}"}, "remember"
+
+        normalized = _WORD_OPERATOR_PATTERN.sub(
+            lambda m: f" {_WORD_OPERATORS[m.group(1).lower()]} ", message
+        )
+        expression = self._extract_expression(normalized)
+        if expression is not None:
+            # 整句只有算式，或算式搭配「計算 / 等於多少」等字眼時才直接判定
+            rest = normalized.replace(expression, "")
+            if not re.search(r"\w", rest) or _ARITHMETIC_WORDS.search(rest):
+                tool_input = expression.replace("×", "*").replace("÷", "/").replace("^", "**")
+                return True, {"tool_name": "calculator", "tool_input": tool_input.strip()}, "calculator"
+
+        if re.search(r"\d", message) or _MEMORY_WORDS.search(message) or _TOOL_WORDS.search(message) \
+                or _QUESTION.search(message):
+            # 有數字、提到記憶或工具相關字眼，或是問句 (可能在問記住的筆記)，無法確定意圖
+            return False, None, "llm_fallback"
+
+        return True, None, "no_tool"
+
+    def _extract_expression(self, message: str) -> Optional[str]:
+        """取出訊息中最長的算式片段"""
+        candidates = [m.group(0).strip() for m in _EXPRESSION.finditer(message)]
+        if not candidates:
+            return None
+        return max(candidates, key=len)
+
+    def stats(self) -> Dict[str, int]:
+        """返回各判定結果的次數"""
+        return dict(self.counters)
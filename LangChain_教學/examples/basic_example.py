@@ -1,16 +1,23 @@
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 from langchain.chains import LLMChain
-from langchain_community.llms import Ollama
 from langchain_core.prompts import PromptTemplate
 
+# 讓範例可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from llm_common.llm_registry import get_llm
+from llm_common.disk_cache import cached
+
 # 載入環境變數
 load_dotenv()
 
 def main():
     # 初始化 Ollama LLM
     model_name = os.getenv("DEFAULT_MODEL", "llama2")
-    llm = Ollama(model=model_name, base_url=os.getenv("OLLAMA_BASE_URL"))
+    # 重複執行時相同的提示可從磁碟快取返回 (temperature 未設定時需 LLM_CACHE=force)
+    llm = cached(get_llm(model_name, base_url=os.getenv("OLLAMA_BASE_URL"), warm=True))
     
     # 基本對話測試
     print("\n=== 基本對話測試 ===")
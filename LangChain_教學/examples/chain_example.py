@@ -1,17 +1,25 @@
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
-from langchain_community.llms import Ollama
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser, CommaSeparatedListOutputParser
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 
+# 讓範例可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from llm_common.llm_registry import get_llm
+from llm_common.disk_cache import cached
+from llm_common.stream_parsers import StreamingListOutputParser, stream_parsed
+
 # 載入環境變數
 load_dotenv()
 
 def main():
     # 初始化 Ollama LLM
     model_name = os.getenv("DEFAULT_MODEL", "llama2")
-    llm = Ollama(model=model_name, base_url=os.getenv("OLLAMA_BASE_URL"))
+    # 重複執行時相同的提示可從磁碟快取返回 (temperature 未設定時需 LLM_CACHE=force)
+    llm = cached(get_llm(model_name, base_url=os.getenv("OLLAMA_BASE_URL"), warm=True))
     
     print("\n===== 簡單鏈 =====")
     # 簡單鏈：提示 -> LLM -> 解析器
@@ -45,7 +53,9 @@ def main():
     
     print("\n===== 使用解析器 =====")
     # 使用解析器獲得結構化輸出
-    parser = CommaSeparatedListOutputParser()
+    # 串流解析：每完成一個項目就輸出，達到要求的數量後立即停止生成
+    number = 5
+    parser = StreamingListOutputParser(max_items=number)
     format_instructions = parser.get_format_instructions()
     
     list_prompt = PromptTemplate.from_template(
@@ -58,15 +68,16 @@ def main():
         | parser
     )
     
-    result = list_chain.invoke({
-        "number": 5,
+    result = []
+    for items in stream_parsed(list_chain, {
+        "number": number,
         "category": "數據科學中的熱門工具",
         "format_instructions": format_instructions
-    })
+    }):
+        result.extend(items)
+        print(f"{len(result)}. {items[0]}")
     
     print("結果類型:", type(result))
-    for i, item in enumerate(result, 1):
-        print(f"{i}. {item}")
     
     print("\n===== 條件鏈 =====")
     # 條件鏈：根據內容切換不同的處理流程
@@ -1,22 +1,31 @@
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
-from langchain_community.llms import Ollama
 from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory, ConversationSummaryMemory
 from langchain.memory import ConversationBufferWindowMemory, ConversationTokenBufferMemory
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough, RunnableConfig
 
+# 讓範例可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from llm_common.llm_registry import get_llm
+from llm_common.disk_cache import cached
+from llm_common.bounded_memory import BoundedConversationMemory
+from llm_common.summary_memory import BackgroundSummaryMemory
+
 load_dotenv()
 
 def main():
     # 初始化 Ollama LLM
     model_name = os.getenv("DEFAULT_MODEL", "llama2")
-    llm = Ollama(model=model_name, base_url=os.getenv("OLLAMA_BASE_URL"))
+    # 重複執行時相同的提示可從磁碟快取返回 (temperature 未設定時需 LLM_CACHE=force)
+    llm = cached(get_llm(model_name, base_url=os.getenv("OLLAMA_BASE_URL"), warm=True))
     
     print("\n===== 基本對話記憶 =====")
-    # 基本對話記憶
-    memory = ConversationBufferMemory()
+    # 基本對話記憶：保留 token 預算內的最近對話，較舊的對話併入滾動摘要
+    # (ConversationBufferMemory 會在每一輪重送完整記錄，提示長度與延遲隨對話無限增長)
+    memory = BoundedConversationMemory(llm=llm, max_token_limit=1000)
     conversation = ConversationChain(
         llm=llm,
         memory=memory,
@@ -29,7 +38,7 @@ def main():
     
     # 檢查記憶內容
     print("\n記憶內容:")
-    print(memory.buffer)
+    print(memory.load_memory_variables({})["history"])
     
     print("\n===== 滑動窗口記憶 =====")
     # 滑動窗口記憶 - 只保留最近的 k 個交互
@@ -47,7 +56,8 @@ def main():
     
     print("\n===== 摘要記憶 =====")
     # 摘要記憶 - 保存對話的摘要而非完整對話
-    summary_memory = ConversationSummaryMemory(llm=llm)
+    # 摘要在背景更新，每輪對話不必等待額外的摘要呼叫；背景忙碌時多輪對話會合併成一次摘要
+    summary_memory = BackgroundSummaryMemory(llm=llm)
     summary_conversation = ConversationChain(
         llm=llm,
         memory=summary_memory,
@@ -58,9 +68,11 @@ def main():
     print(summary_conversation.predict(input="我對人工智能特別感興趣。"))
     print(summary_conversation.predict(input="你能推薦一些入門資源嗎？"))
     
-    # 查看摘要
+    # 查看摘要 (先等待背景的摘要更新完成)
+    summary_memory.flush()
     print("\n對話摘要:")
-    print(summary_memory.moving_summary_buffer)
+    print(summary_memory.buffer)
+    print(f"摘要呼叫 {summary_memory.summary_calls} 次 (共 {summary_memory.turns_saved} 輪對話)")
     
     print("\n===== 使用 LCEL 構建帶記憶的鏈 =====")
     # 使用 LCEL 構建具有記憶功能的應用
@@ -1,20 +1,95 @@
 import os
 import re
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from dotenv import load_dotenv
-from langchain_community.llms import Ollama
 from langchain.tools import tool
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser, PydanticOutputParser
-from langchain_core.pydantic_v1 import BaseModel, Field
+from typing import Literal
+from pydantic import BaseModel, Field, ValidationError
+
+# 讓範例可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from llm_common.safe_calc import safe_eval
+from llm_common.batching import batched
+from llm_common.llm_registry import get_llm
+from llm_common.disk_cache import cached
+from llm_common.stream_parsers import JsonObjectScanner, stream_until_complete
 
 # 載入環境變數
 load_dotenv()
 
+class Deferred:
+    """依序模式下代替 Future：呼叫 result() 時才執行，沒用到的步驟就不會執行"""
+    
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+        self.done = False
+        self.value = None
+    
+    def result(self):
+        if not self.done:
+            self.value = self.fn(*self.args)
+            self.done = True
+        return self.value
+
+def run_questions(handler, questions, label="問題", workers=1):
+    """處理多個問題並依原順序輸出，返回每秒處理的問題數
+    
+    workers > 1 時以有上限的執行緒池同時處理；每個問題的輸出先記錄下來，完成後再依序印出。
+    """
+    def process(question):
+        lines = []
+        answer = handler(question, lines.append)
+        return lines, answer
+    
+    start = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="question") as pool:
+            results = list(pool.map(process, questions))
+    else:
+        results = map(process, questions)
+    
+    for question, (lines, answer) in zip(questions, results):
+        print(f"\n{label}: {question}")
+        for line in lines:
+            print(line)
+        print(f"回答: {answer}")
+    
+    elapsed = time.perf_counter() - start
+    throughput = len(questions) / elapsed
+    print(f"\n處理 {len(questions)} 個問題耗時 {elapsed:.2f}s ({throughput:.2f} 題/秒，{workers} 個工作執行緒)")
+    return throughput
+
 def main():
+    parser = argparse.ArgumentParser(description="LangChain 工具使用示例")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="同時處理的問題數上限，1 表示依序處理")
+    parser.add_argument("--speculate", action="store_true",
+                        help="在 LLM 選擇工具的同時，先執行所有可能被選中的純函數工具")
+    parser.add_argument("--structured", action="store_true",
+                        help="工具選擇改用 Ollama 的 JSON schema 輸出，物件結束時立即停止生成")
+    parser.add_argument("--batch-window", type=float, default=0.0,
+                        help="經由微批次排程器呼叫模型的收集窗口 (秒)，預設不使用 (不會比並行呼叫快)")
+    parser.add_argument("--compare", action="store_true",
+                        help="先依序處理再平行處理，比較每秒處理的問題數")
+    args = parser.parse_args()
+    
     # 初始化 Ollama LLM
     model_name = os.getenv("DEFAULT_MODEL", "llama2")
-    llm = Ollama(model=model_name, base_url=os.getenv("OLLAMA_BASE_URL"))
+    # 各工作執行緒直接並行呼叫共用的模型；指定 --batch-window 時才經由微批次排程器
+    # 快取放在最外層，命中時不必呼叫模型 (temperature 未設定時需 LLM_CACHE=force)
+    llm = get_llm(model_name, base_url=os.getenv("OLLAMA_BASE_URL"), warm=True)
+    if args.batch_window > 0:
+        llm = batched(llm, window=args.batch_window)
+    llm = cached(llm)
     
     print("\n===== 基本工具示例 =====")
     # 基本工具定義
@@ -22,7 +97,7 @@ def main():
     def calculator(expression: str) -> str:
         """計算數學表達式的結果。"""
         try:
-            return str(eval(expression))
+            return str(safe_eval(expression))
         except Exception as e:
             return f"計算錯誤: {str(e)}"
     
@@ -41,16 +116,18 @@ def main():
     
     # 測試基本工具
     print("計算工具結果:", calculator("23 * 7 + 15"))
-    print("日期時間工具:", date_time())
+    print("日期時間工具:", date_time.invoke({}))
     
     print("\n===== 手動工具選擇 =====")
     # 為 Ollama 模型實現手動工具選擇
     class ToolSelection(BaseModel):
-        tool_name: str = Field(description="要使用的工具名稱 (calculator, search, date_time)")
+        tool_name: Literal["calculator", "search", "date_time"] = Field(description="要使用的工具名稱 (calculator, search, date_time)")
         tool_input: str = Field(description="要傳入工具的參數")
     
     # 創建解析器
     parser = PydanticOutputParser(pydantic_object=ToolSelection)
+    # 結構化輸出模式下交給 Ollama 的 JSON schema，模型只能輸出符合格式的物件
+    tool_schema = ToolSelection.model_json_schema()
     
     # 創建工具選擇提示
     tool_prompt = PromptTemplate.from_template("""
@@ -66,17 +143,82 @@ def main():
     {format_instructions}
     """)
     
-    # 工具選擇鏈
-    def select_and_use_tool(question):
-        try:
-            # 格式化工具選擇提示
-            formatted_prompt = tool_prompt.format(
-                question=question,
-                format_instructions=parser.get_format_instructions()
-            )
-            
+    # 互不相依的步驟 (分類、表達式提取、搜索回答、投機執行的工具) 交給這個執行緒池同時進行
+    step_pool = ThreadPoolExecutor(max_workers=max(args.workers, 1) * 2, thread_name_prefix="step")
+    
+    # 沒有副作用、可以提前執行的工具；結果沒被採用時直接丟棄
+    PURE_TOOLS = {"calculator", "date_time", "search"}
+    speculation_stats = {"runs": 0, "hits": 0, "misses": 0, "wasted": 0}
+    stats_lock = threading.Lock()
+    word_operators = {"加上": "+", "加": "+", "減去": "-", "減": "-", "乘以": "*", "乘": "*", "除以": "/"}
+    
+    def guess_expression(question):
+        """從問題中猜出計算式，例如「125 除以 8」-> 125/8"""
+        text = question
+        for word, symbol in word_operators.items():
+            text = text.replace(word, symbol)
+        match = re.search(r"[\d\.\s\(\)]+(?:[\+\-\*\/][\d\.\s\(\)]+)+", text)
+        if match and re.search(r"\d", match.group(0)):
+            return match.group(0).strip()
+        return None
+    
+    def speculate_tools(question):
+        """在 LLM 思考時先執行可能被選中的工具，返回 {工具名稱: (猜測的參數, Future)}"""
+        candidates = {"date_time": ("", lambda _: date_time.invoke({})), "search": (question, search)}
+        expression = guess_expression(question)
+        if expression:
+            candidates["calculator"] = (expression, calculator)
+        
+        futures = {}
+        for name, (tool_input, run) in candidates.items():
+            if name in PURE_TOOLS:
+                futures[name] = (tool_input, step_pool.submit(run, tool_input))
+        with stats_lock:
+            speculation_stats["runs"] += len(futures)
+        return futures
+    
+    def take_speculative(futures, tool_name, tool_input):
+        """取出與 LLM 決定相符的投機結果，其餘記為浪費；沒有相符的結果時返回 None"""
+        result = None
+        guess = futures.pop(tool_name, None)
+        if guess is not None:
+            guessed_input, future = guess
+            same_input = tool_name == "date_time" or \
+                re.sub(r"\s+", "", guessed_input) == re.sub(r"\s+", "", tool_input)
+            if same_input:
+                try:
+                    result = future.result()
+                except Exception:
+                    result = None  # 投機執行失敗時視為未命中，改為正常執行工具
+            else:
+                futures[tool_name] = guess
+        
+        with stats_lock:
+            speculation_stats["hits" if result is not None else "misses"] += 1
+            speculation_stats["wasted"] += len(futures)
+        return result
+    
+    # 工具選擇的解析失敗次數，以及 JSON 物件結束後模型多生成的字元數
+    selection_stats = {"calls": 0, "parse_failures": 0, "wasted_chars": 0}
+    
+    def choose_tool(question, formatted_prompt, log):
+        """請 LLM 選擇工具，返回 (工具名稱, 工具參數)"""
+        failed = False
+        if args.structured:
+            # 以 schema 限制輸出並串流接收，物件一結束就關閉串流
+            scanner = stream_until_complete(llm, formatted_prompt, JsonObjectScanner(), format=tool_schema)
+            try:
+                tool_selection = ToolSelection.model_validate_json(scanner.text or "")
+                tool_name, tool_input = tool_selection.tool_name, tool_selection.tool_input
+            except ValidationError:
+                failed = True
+                log("結構化輸出解析失敗，改用搜索")
+                tool_name, tool_input = "search", question
+        else:
             # 獲取 LLM 回應
             llm_response = llm.invoke(formatted_prompt)
+            scanner = JsonObjectScanner()
+            scanner.feed(llm_response)
             
             # 嘗試解析回應
             try:
@@ -85,21 +227,47 @@ def main():
                 tool_input = tool_selection.tool_input
             except Exception:
                 # 如果解析失敗，使用正則表達式提取
-                print("解析器失敗，嘗試使用正則表達式提取...")
+                failed = True
+                log("解析器失敗，嘗試使用正則表達式提取...")
                 tool_name_match = re.search(r"tool_name[\"']?\s*[:=]\s*[\"']?(\w+)[\"']?", llm_response)
                 tool_input_match = re.search(r"tool_input[\"']?\s*[:=]\s*[\"']?(.+?)[\"']?(?:\n|$)", llm_response)
                 
                 tool_name = tool_name_match.group(1) if tool_name_match else "search"
                 tool_input = tool_input_match.group(1) if tool_input_match else question
+        
+        with stats_lock:
+            selection_stats["calls"] += 1
+            selection_stats["parse_failures"] += failed
+            selection_stats["wasted_chars"] += scanner.wasted
+        return tool_name, tool_input
+    
+    # 工具選擇鏈
+    def select_and_use_tool(question, log=print, overlap=True):
+        speculative = speculate_tools(question) if args.speculate and overlap else None
+        settled = False  # take_speculative 已記錄這次投機執行的統計
+        try:
+            # 格式化工具選擇提示
+            formatted_prompt = tool_prompt.format(
+                question=question,
+                format_instructions=parser.get_format_instructions()
+            )
             
-            print(f"選擇工具: {tool_name}")
-            print(f"工具參數: {tool_input}")
+            tool_name, tool_input = choose_tool(question, formatted_prompt, log)
             
-            # 執行選定的工具
-            if tool_name == "calculator":
+            log(f"選擇工具: {tool_name}")
+            log(f"工具參數: {tool_input}")
+            
+            # 執行選定的工具 (投機執行模式下，結果多半已經算好)
+            result = None
+            if speculative:
+                settled = True
+                result = take_speculative(speculative, tool_name, tool_input)
+            if result is not None:
+                log("使用投機執行的結果")
+            elif tool_name == "calculator":
                 result = calculator(tool_input)
             elif tool_name == "date_time":
-                result = date_time()
+                result = date_time.invoke({})
             else:  # 默認使用搜索
                 result = search(tool_input)
                 
@@ -116,7 +284,11 @@ def main():
         
         except Exception as e:
             # 如果處理出錯，直接使用 LLM 回答
-            print(f"處理工具時出錯: {e}")
+            log(f"處理工具時出錯: {e}")
+            if speculative and not settled:
+                # 還沒決定工具就出錯，所有投機結果都用不到
+                with stats_lock:
+                    speculation_stats["wasted"] += len(speculative)
             return llm.invoke(f"請回答以下問題: {question}")
     
     # 測試工具選擇函數
@@ -126,9 +298,22 @@ def main():
         "Python 是什麼編程語言？",
     ]
     
-    for q in test_questions:
-        print(f"\n問題: {q}")
-        print(f"回答: {select_and_use_tool(q)}")
+    def run_all(handler, questions, label):
+        if not args.compare:
+            run_questions(handler, questions, label, workers=args.workers)
+            return
+        print("\n--- 依序處理 ---")
+        serial = run_questions(lambda q, log: handler(q, log, overlap=False), questions, label)
+        print(f"\n--- 平行處理 ({args.workers} 個工作執行緒) ---")
+        parallel = run_questions(handler, questions, label, workers=args.workers)
+        print(f"吞吐量: 依序 {serial:.2f} 題/秒，平行 {parallel:.2f} 題/秒 (加速 {parallel / serial:.1f} 倍)")
+    
+    run_all(select_and_use_tool, test_questions, "問題")
+    print(f"工具選擇 ({'結構化輸出' if args.structured else '文字解析'}): 呼叫 {selection_stats['calls']} 次，"
+          f"解析失敗 {selection_stats['parse_failures']} 次，物件結束後多生成 {selection_stats['wasted_chars']} 字元")
+    if args.speculate:
+        print(f"投機執行: 執行工具 {speculation_stats['runs']} 次，命中 {speculation_stats['hits']} 次，"
+              f"未命中 {speculation_stats['misses']} 次，浪費 {speculation_stats['wasted']} 次")
     
     print("\n===== 自定義複雜工具 =====")
     # 創建一個對話摘要工具
@@ -180,21 +365,46 @@ def main():
     
     print("\n===== 工具組合使用 =====")
     # 串聯多個工具
-    def process_user_query(query):
-        # 第一步: 分類查詢
-        category = classify_text(query).strip()
-        print(f"查詢分類: {category}")
+    def process_user_query(query, log=print, overlap=True):
+        def start(fn, *fn_args):
+            return step_pool.submit(fn, *fn_args) if overlap else Deferred(fn, *fn_args)
+        
+        def extract_expression():
+            expression_prompt = f"從以下文本中提取數學表達式，僅返回表達式本身: '{query}'"
+            return llm.invoke(expression_prompt).strip()
+        
+        def answer_with_search():
+            search_result = search(query)
+            answer_prompt = f"""
+            用戶查詢: {query}
+            搜索結果: {search_result}
+            
+            基於搜索結果提供詳細回答。
+            """
+            return llm.invoke(answer_prompt)
+        
+        # 第一步: 分類查詢；同時以正則表達式判斷是否為計算題，
+        # 並預先開始之後可能需要的步驟，分類結果出來時它們多半已經完成
+        category_future = start(classify_text, query)
+        looks_like_math = "計算" in query or re.search(r"[\d\+\-\*\/\(\)]+", query)
+        is_time_query = "時間" in query.lower() or "日期" in query.lower()
+        if looks_like_math:
+            expression_future = start(extract_expression)
+        if not looks_like_math and not is_time_query:
+            search_future = start(answer_with_search)
+        
+        category = category_future.result().strip()
+        log(f"查詢分類: {category}")
         
         # 第二步: 基於分類選擇處理方式
-        if "問題" in category and ("計算" in query or re.search(r"[\d\+\-\*\/\(\)]+", query)):
+        if "問題" in category and looks_like_math:
             # 提取數學表達式
-            expression_prompt = f"從以下文本中提取數學表達式，僅返回表達式本身: '{query}'"
-            expression = llm.invoke(expression_prompt).strip()
-            print(f"提取的表達式: {expression}")
+            expression = expression_future.result()
+            log(f"提取的表達式: {expression}")
             
             # 計算結果
             calc_result = calculator(expression)
-            print(f"計算結果: {calc_result}")
+            log(f"計算結果: {calc_result}")
             
             # 格式化答案
             answer_prompt = f"""
@@ -205,22 +415,16 @@ def main():
             """
             return llm.invoke(answer_prompt)
         
-        elif "時間" in query.lower() or "日期" in query.lower():
-            current_time = date_time()
+        elif is_time_query:
+            current_time = date_time.invoke({})
             return f"現在的時間是 {current_time}"
         
         else:
             # 默認使用搜索
-            search_result = search(query)
-            
-            # 格式化答案
-            answer_prompt = f"""
-            用戶查詢: {query}
-            搜索結果: {search_result}
-            
-            基於搜索結果提供詳細回答。
-            """
-            return llm.invoke(answer_prompt)
+            if looks_like_math:
+                # 看起來像計算題但分類不是問題，預先提取的表達式用不到
+                search_future = start(answer_with_search)
+            return search_future.result()
     
     # 測試工具組合
     combo_questions = [
@@ -229,9 +433,8 @@ def main():
         "解釋量子計算的基本原理"
     ]
     
-    for q in combo_questions:
-        print(f"\n組合處理問題: {q}")
-        print(f"回答: {process_user_query(q)}")
+    run_all(process_user_query, combo_questions, "組合處理問題")
+    step_pool.shutdown()
 
 if __name__ == "__main__":
     main()
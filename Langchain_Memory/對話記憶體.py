@@ -1,12 +1,17 @@
+import sys
+from pathlib import Path
 from langchain_ollama.llms import OllamaLLM
 from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
+
+# 讓範例可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from llm_common.bounded_memory import BoundedConversationMemory
 
 # 初始化 LLM
 llm = OllamaLLM(model="qwen2.5:0.5b", temperature=0.7)
 
-# 建立記憶體元件
-memory = ConversationBufferMemory()
+# 建立記憶體元件：只保留 token 預算內的最近對話，較舊的對話併入摘要，提示長度不會無限增長
+memory = BoundedConversationMemory(llm=llm, max_token_limit=1000)
 
 # 建立 ConversationChain，並傳入記憶體
 conversation = ConversationChain(
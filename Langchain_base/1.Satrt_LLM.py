@@ -1,7 +1,14 @@
+import sys
+from pathlib import Path
 from langchain_ollama.llms import OllamaLLM
 
+# 讓範例可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from llm_common.disk_cache import cached
+
 # 初始化 LLM
-llm = OllamaLLM(model="qwen2.5:0.5b" ,temperature=0.7)
+# temperature=0.7 時每次輸出不同，預設不使用快取；設定 LLM_CACHE=force 可讓重複執行直接從磁碟快取返回
+llm = cached(OllamaLLM(model="qwen2.5:0.5b" ,temperature=0.7))
 
 # 簡單的提問
 text = "什麼是人工智慧？"
@@ -1,5 +1,11 @@
+import sys
+from pathlib import Path
 from langchain_ollama.llms import OllamaLLM
 from langchain.prompts import PromptTemplate
+
+# 讓範例可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from llm_common.disk_cache import cached
  
 
 # 建立 prompt 模板
@@ -9,7 +15,8 @@ prompt = PromptTemplate(
 )
 
 # 初始化 LLM
-llm = OllamaLLM(model="qwen2.5:0.5b" ,temperature=0)
+# 相同的提示直接從磁碟快取返回 (預設只快取 temperature=0 的模型)
+llm = cached(OllamaLLM(model="qwen2.5:0.5b" ,temperature=0))
 
 # 使用模板生成內容
 product_prompt = prompt.format(product="智慧型手機")
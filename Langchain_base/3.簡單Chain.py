@@ -1,7 +1,13 @@
+import sys
+from pathlib import Path
 from langchain.chains import LLMChain
 from langchain_ollama import OllamaLLM
 from langchain.prompts import PromptTemplate
 
+# 讓範例可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from llm_common.disk_cache import cached
+
 
 # 建立 prompt 模板
 prompt = PromptTemplate(
@@ -10,7 +16,8 @@ prompt = PromptTemplate(
 )
 
 # 建立 chain
-llm = OllamaLLM(model = "qwen2.5:0.5b", temperature=0.7)
+# temperature=0.7 時每次輸出不同，預設不使用快取；設定 LLM_CACHE=force 可讓重複執行直接從磁碟快取返回
+llm = cached(OllamaLLM(model = "qwen2.5:0.5b", temperature=0.7))
 chain = prompt | llm 
 
 # 執行 chain
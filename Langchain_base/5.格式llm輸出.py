@@ -1,11 +1,19 @@
+import sys
+from pathlib import Path
 from langchain_ollama import OllamaLLM
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import CommaSeparatedListOutputParser
 from operator import itemgetter
 
+# 讓範例可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from llm_common.disk_cache import cached
+from llm_common.stream_parsers import StreamingListOutputParser, stream_parsed
+
 # 初始化 LLM 和解析器
-llm = OllamaLLM(model="qwen2.5:0.5b", temperature=0.7)
-parser = CommaSeparatedListOutputParser()
+# temperature=0.7 時每次輸出不同，預設不使用快取；設定 LLM_CACHE=force 可讓重複執行直接從磁碟快取返回
+llm = cached(OllamaLLM(model="qwen2.5:0.5b", temperature=0.7))
+# 串流解析：每完成一個項目就輸出，列出三個特點後立即停止生成
+parser = StreamingListOutputParser(max_items=3)
 
 # 建立第一個 prompt template（加入格式說明）
 first_prompt = PromptTemplate.from_template(
@@ -17,6 +25,8 @@ first_prompt = PromptTemplate.from_template(
 # 建立串接的 chain
 chain = first_prompt | llm | parser
 
-result = chain.invoke({"topic": "Python程式語言"})
+result = []
+for items in stream_parsed(chain, {"topic": "Python程式語言"}):
+    result.extend(items)
 print(result)
 
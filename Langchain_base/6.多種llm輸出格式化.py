@@ -1,17 +1,24 @@
+import sys
+from pathlib import Path
 from langchain_ollama import OllamaLLM
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import CommaSeparatedListOutputParser,\
-    JsonOutputParser
 
 from typing import List
 
+# 讓範例可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from llm_common.disk_cache import cached
+from llm_common.stream_parsers import StreamingListOutputParser, StreamingJsonOutputParser, stream_parsed
+
 
 
 # 初始化 LLM
-llm = OllamaLLM(model="qwen2.5:0.5b", temperature=0.7)
+# temperature=0.7 時每次輸出不同，預設不使用快取；設定 LLM_CACHE=force 可讓重複執行直接從磁碟快取返回
+llm = cached(OllamaLLM(model="qwen2.5:0.5b", temperature=0.7))
 
 # 1. 逗號分隔列表解析器
-list_parser = CommaSeparatedListOutputParser()
+# 串流解析：列出三個特點後立即停止生成
+list_parser = StreamingListOutputParser(max_items=3)
 list_prompt = PromptTemplate.from_template(
     """請列出{topic}的三個主要特點
     請用逗號分隔每個特點，不要加編號
@@ -19,7 +26,8 @@ list_prompt = PromptTemplate.from_template(
 )
 
 # 2. JSON 格式解析器
-json_parser = JsonOutputParser()
+# 串流解析：JSON 物件一結束就停止生成，忽略之後的說明文字
+json_parser = StreamingJsonOutputParser()
 json_prompt = PromptTemplate.from_template(
     """請提供{topic}的資訊，包含以下欄位：
     - name: 名稱
@@ -38,14 +46,18 @@ json_prompt = PromptTemplate.from_template(
 def test_parsers(topic: str):
     # 測試列表解析器
     list_chain = list_prompt | llm | list_parser
-    list_result = list_chain.invoke({"topic": topic})
+    list_result = []
+    for items in stream_parsed(list_chain, {"topic": topic}):
+        list_result.extend(items)
     print("列表格式輸出：")
     print(list_result)
     print("\n")
 
     # 測試 JSON 解析器
     json_chain = json_prompt | llm | json_parser
-    json_result = json_chain.invoke({"topic": topic})
+    json_result = None
+    for partial in stream_parsed(json_chain, {"topic": topic}):
+        json_result = partial  # 欄位逐步補齊，最後一次即為完整的物件
     print("JSON 格式輸出：")
     print(json_result)
     print("\n")
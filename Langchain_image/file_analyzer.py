@@ -1,29 +1,147 @@
+import io
 import os
+import sys
+import glob
+import json
+import hashlib
+import time
+import argparse
+import threading
+from collections import deque
+from functools import partial
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 import magic
 import PyPDF2
 import docx
 import PIL.Image
-from langchain_community.llms import Ollama
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pathlib import Path
 
-def detect_file_type(file_path):
-    mime = magic.Magic(mime=True)
-    file_type = mime.from_file(file_path)
-    return file_type
+# 讓程式可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from llm_common.batching import batched
+from llm_common.llm_registry import get_llm as get_shared_llm
+from llm_common.tokens import estimate_tokens
+from llm_common.file_cache import FileCache
 
-def read_text_file(file_path):
+MODEL_NAME = "mistral"
+# 大於 0 時經由微批次排程器呼叫模型 (預設關閉：無法合併請求，不會比並行呼叫快)
+BATCH_WINDOW = 0.0
+_llm = None
+
+def get_llm():
+    # 所有分析共用同一個模型，底層的 HTTP 連線也會重複使用；同時呼叫數由各處的執行緒池限制
+    global _llm
+    if _llm is None:
+        _llm = get_shared_llm(MODEL_NAME, warm=True)
+        if BATCH_WINDOW > 0:
+            _llm = batched(_llm, window=BATCH_WINDOW)
+    return _llm
+
+HEADER_BYTES = 8192  # 偵測類型時讀取的檔頭大小
+
+# 信任副檔名時直接採用的類型，以及用來確認的檔頭特徵 (文字檔只確認檔頭沒有 NUL 位元組)
+TRUSTED_EXTENSIONS = {
+    ".txt": ("text/plain", None),
+    ".md": ("text/plain", None),
+    ".pdf": ("application/pdf", b"%PDF"),
+    ".docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", b"PK\x03\x04"),
+    ".png": ("image/png", b"\x89PNG"),
+    ".jpg": ("image/jpeg", b"\xff\xd8\xff"),
+    ".jpeg": ("image/jpeg", b"\xff\xd8\xff"),
+    ".gif": ("image/gif", b"GIF8"),
+}
+
+_magic_local = threading.local()
+
+def _magic():
+    # 每個執行緒共用一個 libmagic 物件，不必每次重新建立並載入類型資料庫
+    handle = getattr(_magic_local, "handle", None)
+    if handle is None:
+        handle = _magic_local.handle = magic.Magic(mime=True)
+    return handle
+
+def read_header(file_path):
+    with open(file_path, 'rb') as file:
+        return file.read(HEADER_BYTES)
+
+def detect_file_type(file_path, header=None, trust_extensions=False):
+    """由檔頭偵測 MIME 類型；trust_extensions 時常見的副檔名只確認檔頭特徵就直接採用"""
+    if header is None:
+        header = read_header(file_path)
+    if trust_extensions:
+        file_type, signature = TRUSTED_EXTENSIONS.get(os.path.splitext(file_path)[1].lower(), (None, None))
+        if file_type and (header.startswith(signature) if signature else b"\0" not in header):
+            return file_type
+    return _magic().from_buffer(header)
+
+def read_text_file(file_path, data=None):
+    if data is not None:
+        # 使用已經讀取的內容 (與開檔讀取相同的解碼與換行處理)
+        return io.TextIOWrapper(io.BytesIO(data), encoding='utf-8').read()
     with open(file_path, 'r', encoding='utf-8') as file:
         return file.read()
 
-def read_pdf_file(file_path):
-    text = ""
+PDF_PAGES_PER_TASK = 50  # 平行讀取時每個工作行程一次處理的頁數
+
+def _pdf_page_count(file_path):
     with open(file_path, 'rb') as file:
-        pdf_reader = PyPDF2.PdfReader(file)
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-    return text
+        return len(PyPDF2.PdfReader(file).pages)
+
+_worker_reader = (None, None)  # 工作行程保留最近開啟的 ((路徑, 修改時間, 大小), PdfReader)，同一份文件只解析一次
+
+def _read_pdf_pages(file_path, start, stop):
+    """在工作行程中讀取 [start, stop) 頁的文字"""
+    global _worker_reader
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    cached_key, reader = _worker_reader
+    if cached_key != key:
+        with open(file_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(io.BytesIO(file.read()))
+        _worker_reader = (key, reader)
+    pages = reader.pages
+    return [pages[i].extract_text() or "" for i in range(start, stop)]
+
+def iter_pdf_pages(file_path, workers=1, pages_per_task=PDF_PAGES_PER_TASK):
+    """逐頁產生 PDF 的文字
+    
+    workers > 1 且頁數足夠時，把頁面範圍分給多個行程同時讀取，仍按頁序輸出；
+    最多預先讀取 workers * 2 個範圍。只需要前幾頁的呼叫端可以提早停止，不必解析整份文件。
+    """
+    page_count = _pdf_page_count(file_path) if workers > 1 else 0
+    if page_count <= pages_per_task:
+        with open(file_path, 'rb') as file:
+            for page in PyPDF2.PdfReader(file).pages:
+                yield page.extract_text() or ""
+        return
+    
+    starts = iter(range(0, page_count, pages_per_task))
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def submit_next():
+            start = next(starts, None)
+            if start is not None:
+                pending.append(pool.submit(_read_pdf_pages, file_path, start, min(start + pages_per_task, page_count)))
+        
+        try:
+            for _ in range(workers * 2):
+                submit_next()
+            while pending:
+                texts = pending.popleft().result()
+                submit_next()
+                yield from texts
+        finally:
+            # 呼叫端提前停止時取消尚未開始的範圍
+            for future in pending:
+                future.cancel()
+
+def read_pdf_file(file_path, workers=1):
+    # 各頁文字最後一次合併 (逐頁 += 的成本隨頁數平方增長)；
+    # 分析與文字快取都需要完整內容，因此全文仍會放在記憶體中，逐頁讀取並不降低記憶體用量
+    return "\n".join(iter_pdf_pages(file_path, workers))
 
 def read_docx_file(file_path):
     doc = docx.Document(file_path)
@@ -36,67 +154,366 @@ def analyze_image(file_path):
     image = PIL.Image.open(file_path)
     return f"Image format: {image.format}\nSize: {image.size}\nMode: {image.mode}"
 
-def analyze_content(content, file_type):
-    # 使用 Ollama 的 mistral 模型
-    llm = Ollama(model="mistral")
-    
-    template = """請分析以下內容，並提供詳細的分析報告：
-    文件類型: {file_type}
-    內容:
-    {content}
-    
+# 分段分析的預設值：每段的 token 數、相鄰段落重疊的 token 數、同時分析的段數
+CHUNK_TOKENS = 1500
+CHUNK_OVERLAP = 150
+MAP_CONCURRENCY = 4
+
+REPORT_ITEMS = """
     請提供：
     1. 文件主要內容概述
     2. 關鍵主題或要點
     3. 如果是圖片，描述圖片的基本特徵
     4. 任何特別發現或建議
     """
-    
-    prompt = PromptTemplate(
-        template=template,
-        input_variables=["content", "file_type"]
+
+ANALYSIS_TEMPLATE = """請分析以下內容，並提供詳細的分析報告：
+    文件類型: {file_type}
+    內容:
+    {content}
+    """ + REPORT_ITEMS
+
+MAP_TEMPLATE = """以下是一份文件 (類型: {file_type}) 的第 {index}/{total} 段。
+請條列整理這一段的主要內容、關鍵主題與值得注意的地方，不需要開場白：
+{content}
+"""
+
+COLLAPSE_TEMPLATE = """以下是同一份文件 (類型: {file_type}) 中連續幾段的分析筆記。
+請合併成一份較精簡的筆記，保留所有重要主題與發現：
+{content}
+"""
+
+REDUCE_TEMPLATE = """以下是一份文件各段落的分析筆記，請整合成完整的分析報告：
+    文件類型: {file_type}
+    各段分析:
+    {content}
+    """ + REPORT_ITEMS
+
+def split_content(content, chunk_tokens=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP):
+    """依估計的 token 數把內容切成段落 (優先在空行、換行、句子與空白處切開)"""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_tokens,
+        chunk_overlap=chunk_overlap,
+        length_function=estimate_tokens,
+        separators=["\n\n", "\n", "。", ". ", " ", ""],
     )
+    return splitter.split_text(content)
+
+def _run_prompts(template, llm, inputs, concurrency):
+    chain = PromptTemplate.from_template(template) | llm | StrOutputParser()
+    if len(inputs) == 1:
+        return [chain.invoke(inputs[0])]
+    # LLM 的 batch() 會逐一處理提示，因此用執行緒池同時呼叫
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="map") as pool:
+        return list(pool.map(chain.invoke, inputs))
+
+def _group_notes(notes, max_tokens):
+    """把連續的筆記分組，每組不超過 max_tokens (每組至少兩則，保證每一輪都會減少筆記數)"""
+    groups, current, current_tokens = [], [], 0
+    for note in notes:
+        tokens = estimate_tokens(note)
+        if len(current) >= 2 and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(note)
+        current_tokens += tokens
+    groups.append(current)
+    return groups
+
+def analysis_signature(chunk_tokens=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP):
+    """影響報告內容的設定 (模型、分段參數與提示模板) 的雜湊，作為報告快取鍵的一部分"""
+    payload = json.dumps([MODEL_NAME, chunk_tokens, chunk_overlap,
+                          ANALYSIS_TEMPLATE, MAP_TEMPLATE, COLLAPSE_TEMPLATE, REDUCE_TEMPLATE])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def analyze_content(content, file_type, chunk_tokens=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP,
+                    concurrency=MAP_CONCURRENCY, llm=None):
+    """產生四項分析報告
     
-    # 使用 LangChain 2.0 的新方式創建處理鏈
-    chain = (
-        {"content": RunnablePassthrough(), "file_type": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
+    內容超過 chunk_tokens 時先同時分析各段 (map)，再把各段筆記整合成報告 (reduce)；
+    筆記太長放不進一次提示時先分組合併。每次呼叫的提示長度都有上限，延遲不會隨文件大小增長。
+    """
+    # 預設使用 Ollama 的 mistral 模型
+    llm = llm or get_llm()
     
-    return chain.invoke({"content": content, "file_type": file_type})
+    chunks = split_content(content, chunk_tokens, chunk_overlap) if content else []
+    if len(chunks) <= 1:
+        return _run_prompts(ANALYSIS_TEMPLATE, llm, [{"content": content, "file_type": file_type}], concurrency)[0]
+    
+    notes = _run_prompts(MAP_TEMPLATE, llm, [
+        {"content": chunk, "file_type": file_type, "index": index, "total": len(chunks)}
+        for index, chunk in enumerate(chunks, 1)
+    ], concurrency)
+    
+    while len(notes) > 1 and estimate_tokens("\n\n".join(notes)) > chunk_tokens:
+        notes = _run_prompts(COLLAPSE_TEMPLATE, llm, [
+            {"content": "\n\n".join(group), "file_type": file_type}
+            for group in _group_notes(notes, chunk_tokens)
+        ], concurrency)
+    
+    return _run_prompts(REDUCE_TEMPLATE, llm, [{"content": "\n\n".join(notes), "file_type": file_type}], concurrency)[0]
 
-def main():
-    file_path = input("請輸入要分析的檔案路徑: ")
+class UnsupportedFileType(ValueError):
+    pass
+
+def extract_content(file_path, file_type, pdf_workers=1):
+    """依檔案類型取出文字內容 (圖片則為基本資訊)"""
+    if file_type.startswith('text/'):
+        return read_text_file(file_path)
+    elif file_type == 'application/pdf':
+        return read_pdf_file(file_path, pdf_workers)
+    elif file_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
+        return read_docx_file(file_path)
+    elif file_type.startswith('image/'):
+        return analyze_image(file_path)
+    raise UnsupportedFileType("不支援的檔案格式！")
+
+def extract_file(file_path, trust_extensions=False):
+    """在工作行程中偵測類型並取出內容，錯誤記錄在結果中而不拋出"""
+    start = time.perf_counter()
+    record = {"path": str(file_path), "file_type": None, "content": None, "error": None}
+    try:
+        with open(file_path, 'rb') as file:
+            header = file.read(HEADER_BYTES)
+            record["file_type"] = detect_file_type(file_path, header, trust_extensions)
+            if record["file_type"].startswith('text/'):
+                # 文字檔接著讀取剩下的內容，整個檔案只開啟、讀取一次
+                record["content"] = read_text_file(file_path, header + file.read())
+        if record["content"] is None:
+            record["content"] = extract_content(file_path, record["file_type"])
+    except Exception as e:
+        record["error"] = str(e)
+    record["extract_ms"] = (time.perf_counter() - start) * 1000
+    return record
+
+def collect_files(target):
+    """資料夾 (遞迴)、萬用字元或單一檔案 -> 依名稱排序的檔案清單"""
+    if os.path.isdir(target):
+        return sorted(str(path) for path in Path(target).rglob("*") if path.is_file())
+    if glob.has_magic(target):
+        return sorted(path for path in glob.glob(target, recursive=True) if os.path.isfile(path))
+    return [target] if os.path.isfile(target) else []
+
+class StageStats:
+    """記錄一個處理階段完成的檔案數、處理量與耗時"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.chars = 0
+        self.busy = 0.0
+        self.start = time.perf_counter()
+        self.last = self.start
+    
+    def record(self, seconds, chars=0):
+        self.count += 1
+        self.chars += chars
+        self.busy += seconds
+        self.last = time.perf_counter()
+    
+    def report(self):
+        elapsed = max(self.last - self.start, 1e-9)
+        average = self.busy / self.count * 1000 if self.count else 0.0
+        return (f"{self.name}: {self.count} 個檔案，{self.count / elapsed:.1f} 檔/秒，"
+                f"{self.chars / elapsed / 1000:.1f} K 字元/秒，平均每檔 {average:.1f} ms")
+
+def run_batch(files, output_path, workers=None, llm_concurrency=4, analyze=None, cache=None, signature="",
+              trust_extensions=False):
+    """批次分析：行程池偵測類型與取出內容，有上限的執行緒池呼叫 LLM，結果逐行寫入 JSONL
+    
+    等待分析的文件最多保留 llm_concurrency * 2 份，LLM 跟不上時取出內容的階段會暫停，記憶體用量維持固定。
+    提供 cache 時，內容沒變的檔案直接沿用報告 (跳過所有階段)，或沿用取出的文字 (只重新分析)。
+    """
+    analyze = analyze or analyze_content
+    workers = workers or os.cpu_count() or 1
+    max_extracting = workers * 2
+    max_waiting = llm_concurrency * 2
+    stats = {stage: StageStats(name) for stage, name in
+             [("extract", "取出內容"), ("analyze", "LLM 分析"), ("write", "寫入結果")]}
+    
+    def analyze_record(record):
+        start = time.perf_counter()
+        try:
+            record["analysis"] = analyze(record["content"], record["file_type"])
+        except Exception as e:
+            record["error"] = f"分析失敗: {e}"
+        record["analyze_ms"] = (time.perf_counter() - start) * 1000
+        return record
+    
+    keys = {}  # 檔案路徑 -> 內容快取鍵
+    
+    def lookup(file_path):
+        """有快取的報告時返回完整記錄，只有取出的文字時返回待分析的記錄，都沒有時返回 None"""
+        if cache is None:
+            return None
+        try:
+            keys[file_path] = key = cache.file_key(file_path)
+        except OSError:
+            return None
+        report = cache.get("report", f"{key}|{signature}")
+        if report is not None:
+            return {"path": file_path, **report, "error": None, "cached": "report"}
+        text = cache.get("text", key)
+        if text is not None:
+            return {"path": file_path, **text, "error": None, "cached": "text"}
+        return None
+    
+    def store(tier, record):
+        key = keys.get(record["path"])
+        if key is None or record["error"]:
+            return
+        if tier == "text":
+            cache.put("text", key, {"file_type": record["file_type"], "content": record["content"]}, record["path"])
+        else:
+            cache.put("report", f"{key}|{signature}", {"file_type": record["file_type"], "analysis": record["analysis"],
+                                                        "chars": len(record["content"] or "")}, record["path"])
     
+    pending_files = iter(files)
+    extracting, analyzing, waiting = set(), set(), deque()
+    with ProcessPoolExecutor(max_workers=workers) as extract_pool, \
+            ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="analyze") as llm_pool, \
+            open(output_path, "w", encoding="utf-8") as output:
+        
+        def write(record):
+            start = time.perf_counter()
+            keys.pop(record["path"], None)
+            content = record.pop("content", None)
+            chars = record.setdefault("chars", len(content or ""))
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            stats["write"].record(time.perf_counter() - start, chars)
+        
+        while True:
+            while len(extracting) < max_extracting and len(waiting) < max_waiting:
+                file_path = next(pending_files, None)
+                if file_path is None:
+                    break
+                record = lookup(file_path)
+                if record is None:
+                    extracting.add(extract_pool.submit(extract_file, file_path, trust_extensions))
+                elif "analysis" in record:
+                    write(record)
+                else:
+                    waiting.append(record)
+            while waiting and len(analyzing) < llm_concurrency:
+                analyzing.add(llm_pool.submit(analyze_record, waiting.popleft()))
+            if not extracting and not analyzing:
+                break
+            
+            done, _ = wait(extracting | analyzing, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                if future in extracting:
+                    extracting.remove(future)
+                    stats["extract"].record(record["extract_ms"] / 1000, len(record["content"] or ""))
+                    if record["error"]:
+                        write(record)
+                    else:
+                        if cache is not None:
+                            store("text", record)
+                        waiting.append(record)
+                else:
+                    analyzing.remove(future)
+                    stats["analyze"].record(record["analyze_ms"] / 1000, len(record["content"] or ""))
+                    if cache is not None:
+                        store("report", record)
+                    write(record)
+    
+    return stats
+
+def analyze_single(file_path, analyze=None, cache=None, signature="", trust_extensions=False, pdf_workers=1):
+    """互動模式：分析單一檔案並印出結果"""
     if not os.path.exists(file_path):
         print("檔案不存在！")
         return
     
-    file_type = detect_file_type(file_path)
+    key = cache.file_key(file_path) if cache is not None else None
+    report = cache.get("report", f"{key}|{signature}") if key else None
+    if report is not None:
+        print(f"檔案類型: {report['file_type']}")
+        print("\n分析結果 (快取):")
+        print(report["analysis"])
+        return
+    
+    text = cache.get("text", key) if key else None
+    file_type = text["file_type"] if text else detect_file_type(file_path, trust_extensions=trust_extensions)
     print(f"檔案類型: {file_type}")
     
     try:
-        content = ""
-        if file_type.startswith('text/'):
-            content = read_text_file(file_path)
-        elif file_type == 'application/pdf':
-            content = read_pdf_file(file_path)
-        elif file_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-            content = read_docx_file(file_path)
-        elif file_type.startswith('image/'):
-            content = analyze_image(file_path)
+        if text:
+            content = text["content"]
         else:
-            print("不支援的檔案格式！")
-            return
-        
-        analysis = analyze_content(content, file_type)
+            content = extract_content(file_path, file_type, pdf_workers=pdf_workers)
+            if key:
+                cache.put("text", key, {"file_type": file_type, "content": content}, file_path)
+        analysis = (analyze or analyze_content)(content, file_type)
+        if key:
+            cache.put("report", f"{key}|{signature}",
+                      {"file_type": file_type, "analysis": analysis, "chars": len(content)}, file_path)
         print("\n分析結果:")
         print(analysis)
-        
+    
+    except UnsupportedFileType as e:
+        print(str(e))
     except Exception as e:
         print(f"處理檔案時發生錯誤: {str(e)}")
 
+def main():
+    global BATCH_WINDOW
+    parser = argparse.ArgumentParser(description="檔案內容分析")
+    parser.add_argument("target", nargs="?", help="檔案、資料夾或萬用字元 (例如 'docs/**/*.pdf')；省略時互動輸入")
+    parser.add_argument("--output", default="analysis.jsonl", help="批次模式的 JSONL 輸出檔")
+    parser.add_argument("--workers", type=int, help="取出內容的行程數 (預設為 CPU 核心數)")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="同時進行的 LLM 分析數")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="分段分析時每段的 token 數")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP, help="相鄰段落重疊的 token 數")
+    parser.add_argument("--map-concurrency", type=int, default=MAP_CONCURRENCY, help="每份文件同時分析的段數")
+    parser.add_argument("--pdf-workers", type=int, default=1,
+                        help="單一檔案模式下平行讀取大型 PDF 的行程數 (預設 1；先用 file_analyzer_benchmark.py pdf 確認有加速)")
+    parser.add_argument("--trust-extensions", action="store_true",
+                        help="常見副檔名 (txt、pdf、docx、png 等) 只確認檔頭特徵，不交給 libmagic 偵測")
+    parser.add_argument("--batch-window", type=float, default=0.0,
+                        help="經由微批次排程器呼叫模型的收集窗口 (秒)，預設不使用 (不會比並行呼叫快)")
+    parser.add_argument("--no-cache", action="store_true", help="不讀取也不寫入結果快取")
+    parser.add_argument("--clear-cache", action="store_true", help="執行前清除結果快取 (取出的文字與分析報告)")
+    args = parser.parse_args()
+    BATCH_WINDOW = args.batch_window
+    
+    analyze = partial(analyze_content, chunk_tokens=args.chunk_tokens, chunk_overlap=args.chunk_overlap,
+                      concurrency=args.map_concurrency)
+    signature = analysis_signature(args.chunk_tokens, args.chunk_overlap)
+    
+    cache = None if args.no_cache else FileCache()
+    if args.clear_cache:
+        (cache or FileCache()).clear()
+        print("已清除結果快取")
+        if args.target is None:
+            return
+    
+    if args.target is None:
+        analyze_single(input("請輸入要分析的檔案路徑: "), analyze, cache, signature, args.trust_extensions,
+                       args.pdf_workers)
+        return
+    if os.path.isfile(args.target):
+        analyze_single(args.target, analyze, cache, signature, args.trust_extensions,
+                       args.pdf_workers)
+        return
+    
+    files = collect_files(args.target)
+    if not files:
+        print("找不到任何檔案！")
+        return
+    
+    print(f"共 {len(files)} 個檔案，結果寫入 {args.output}")
+    start = time.perf_counter()
+    stats = run_batch(files, args.output, workers=args.workers, llm_concurrency=args.llm_concurrency,
+                      analyze=analyze, cache=cache, signature=signature, trust_extensions=args.trust_extensions)
+    print(f"\n完成，總耗時 {time.perf_counter() - start:.1f}s")
+    for stage in stats.values():
+        print(stage.report())
+    if cache is not None:
+        tiers = cache.stats()
+        print(f"快取: {tiers['report']['hits']} 個檔案沿用報告，{tiers['text']['hits']} 個檔案沿用取出的文字")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,206 @@
+"""檔案內容分析的效能基準測試
+
+使用合成的檔案與模擬的 LLM (延遲隨提示長度增加)，不需要啟動 Ollama：
+    pdf      逐頁 += 合併 vs 逐頁讀取後一次合併 vs 多行程平行讀取頁面範圍
+    analyze  整份內容放進一次提示 vs 分段 map-reduce
+    detect   各種檔案類型偵測方式處理大量小檔案的速度
+
+用法:
+    python file_analyzer_benchmark.py [pdf analyze detect] [--pages 1000] [--files 10000]
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import magic
+import PyPDF2
+import docx
+import PIL.Image
+
+# 讓程式可以匯入專案根目錄的共用模組
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from llm_common.stub_llm import PrefillStubLLM
+from llm_common.tokens import estimate_tokens
+
+from file_analyzer import (CHUNK_OVERLAP, CHUNK_TOKENS, MAP_CONCURRENCY, _magic, analyze_content,
+                           detect_file_type, extract_content, extract_file, iter_pdf_pages, read_pdf_file)
+
+
+def write_synthetic_pdf(file_path, pages, lines_per_page=40):
+    """產生每頁都有數十行文字的 PDF，用於效能測試"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for number in range(pages):
+        lines = "".join(f"({number + 1}-{line}: The quick brown fox jumps over the lazy dog) Tj T* "
+                        for line in range(lines_per_page))
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td {lines}ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(objects))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    with open(file_path, 'wb') as file:
+        file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(file.tell())
+            file.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = file.tell()
+        file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        file.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+        file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def bench_pdf(pages=1000):
+    """逐頁 += 合併 vs 逐頁讀取後一次合併 vs 多行程平行讀取頁面範圍 (三者最後都持有全文)"""
+    print(f"\n===== PDF 讀取 ({os.cpu_count()} 個 CPU 核心) =====")
+    def read_concat(file_path):
+        text = ""
+        with open(file_path, 'rb') as file:
+            for page in PyPDF2.PdfReader(file).pages:
+                text += page.extract_text()
+        return text
+
+    workers = max(os.cpu_count() or 1, 2)
+    methods = [("逐頁 += 合併", read_concat),
+               ("一次合併 (單一行程)", lambda path: read_pdf_file(path)),
+               (f"平行讀取 ({workers} 個行程)", lambda path: read_pdf_file(path, workers))]
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "synthetic.pdf")
+        write_synthetic_pdf(file_path, pages)
+        print(f"合成 PDF: {pages} 頁，{os.path.getsize(file_path) / 1e6:.1f} MB")
+
+        for name, read in methods:
+            start = time.perf_counter()
+            text = read(file_path)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<16} {elapsed:6.2f}s  {pages / elapsed:7.1f} 頁/秒  {len(text) / 1e6:.2f} M 字元")
+
+        # 只處理前幾頁時，逐頁讀取不必解析整份文件 (這是逐頁讀取唯一的好處，分析流程仍使用全文)
+        start = time.perf_counter()
+        first = [text for _, text in zip(range(10), iter_pdf_pages(file_path))]
+        print(f"只讀前 {len(first)} 頁: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def bench_analyze(chunk_tokens=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP, concurrency=MAP_CONCURRENCY):
+    """整份內容放進一次提示 vs 分段 map-reduce：總耗時、單次呼叫的最長延遲與內容涵蓋率
+
+    模擬模型的延遲隨提示長度線性增加，超過 context_tokens 的部分會被截斷 (不處理也不計時)。
+    """
+    print("\n===== 整份分析 vs 分段分析 (模擬模型每個提示 token 50 µs) =====")
+    line = "The quick brown fox jumps over the lazy dog while the analyst reads page after page.\n"
+    for size in (2000, 20000, 100000):
+        content = line * (size // estimate_tokens(line))
+        for name, options in [("整份", {"chunk_tokens": 10 ** 9}),
+                              ("分段", {"chunk_tokens": chunk_tokens, "chunk_overlap": chunk_overlap})]:
+            llm = PrefillStubLLM(per_token_latency=0.00005, response="- 重點：示範內容\n- 主題：效能測試")
+            start = time.perf_counter()
+            analyze_content(content, "text/plain", concurrency=concurrency, llm=llm, **options)
+            elapsed = time.perf_counter() - start
+            print(f"{size:>7} tokens {name}: 總耗時 {elapsed:6.2f}s，{llm.calls:3d} 次呼叫，"
+                  f"單次最長 {llm.max_call_ms:7.1f} ms，內容涵蓋 {min(llm.min_coverage, 1.0):6.1%}")
+
+
+def bench_detect(count=10000):
+    """每次建立 libmagic 物件 vs 共用物件 vs 共用物件只讀檔頭 vs 信任副檔名：偵測大量小檔案的速度
+
+    另外比較批次模式實際執行的「偵測 + 取出內容」：先偵測再另外開檔讀取，
+    與 extract_file 讀一次檔頭同時用於偵測與文字內容。
+    """
+    print("\n===== 檔案類型偵測 =====")
+    def image_bytes(kind):
+        buffer = io.BytesIO()
+        PIL.Image.new("RGB", (8, 8), "white").save(buffer, kind)
+        return buffer.getvalue()
+
+    document = io.BytesIO()
+    docx.Document().save(document)
+    line = "The quick brown fox jumps over the lazy dog.\n"
+    samples = [
+        (".txt", (line * 20).encode()),
+        (".md", ("# 標題\n\n" + line * 10).encode()),
+        (".csv", b"name,score\n" + b"fox,1\n" * 50),
+        (".png", image_bytes("PNG")),
+        (".jpg", image_bytes("JPEG")),
+        (".docx", document.getvalue()),
+        (".pdf", line.encode()),  # 副檔名與內容不符，信任副檔名時也會交給 libmagic
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "sample.pdf")
+        write_synthetic_pdf(pdf_path, 1)
+        with open(pdf_path, 'rb') as file:
+            samples.append((".pdf", file.read()))
+
+        files = []
+        for i in range(count):
+            extension, data = samples[i % len(samples)]
+            files.append(os.path.join(tmp, f"file{i}{extension}"))
+            with open(files[-1], 'wb') as file:
+                file.write(data)
+        print(f"{count} 個小檔案 ({len(samples)} 種，平均 {sum(len(d) for _, d in samples) / len(samples) / 1024:.1f} KB)")
+
+        methods = [
+            ("每次建立 libmagic", lambda path: magic.Magic(mime=True).from_file(path)),
+            ("共用物件 from_file", lambda path: _magic().from_file(path)),
+            ("共用物件 + 檔頭", detect_file_type),
+            ("信任副檔名", lambda path: detect_file_type(path, trust_extensions=True)),
+        ]
+        baseline = None
+        for name, detect in methods:
+            start = time.perf_counter()
+            results = [detect(path) for path in files]
+            elapsed = time.perf_counter() - start
+            baseline = baseline or results
+            same = sum(a == b for a, b in zip(results, baseline)) / count
+            print(f"{name:<16} {elapsed:6.2f}s  {elapsed / count * 1e6:6.0f} µs/檔  {count / elapsed:7.0f} 檔/秒  "
+                  f"與原本結果一致 {same:.1%}")
+
+        def detect_then_read(path):
+            file_type = _magic().from_file(path)
+            return file_type, extract_content(path, file_type) if file_type.startswith('text/') else None
+
+        def header_once(path):
+            record = extract_file(path)
+            return record["file_type"], record["content"] if record["file_type"].startswith('text/') else None
+
+        # 只計算文字檔：其他類型的解析成本與偵測方式無關
+        text_files = [path for path in files if os.path.splitext(path)[1] in (".txt", ".md", ".csv")]
+        print("文字檔偵測 + 讀取:")
+        for name, run in [("偵測後另外讀取", detect_then_read), ("檔頭同時用於偵測與內容", header_once)]:
+            start = time.perf_counter()
+            for path in text_files:
+                run(path)
+            elapsed = time.perf_counter() - start
+            print(f"  {name:<14} {elapsed / len(text_files) * 1e6:6.0f} µs/檔")
+
+
+BENCHMARKS = {
+    "pdf": lambda args: bench_pdf(args.pages),
+    "analyze": lambda args: bench_analyze(),
+    "detect": lambda args: bench_detect(args.files),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="檔案內容分析效能基準測試")
+    parser.add_argument("names", nargs="*", help=f"要執行的項目: {', '.join(BENCHMARKS)} (預設全部)")
+    parser.add_argument("--pages", type=int, default=1000, help="合成 PDF 的頁數")
+    parser.add_argument("--files", type=int, default=10000, help="類型偵測測試的小檔案數")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的項目: {', '.join(unknown)}")
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name](args)
+
+
+if __name__ == "__main__":
+    main()
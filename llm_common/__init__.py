@@ -0,0 +1,7 @@
+"""課程範例共用的工具模組
+
+範例腳本位於不同的資料夾，使用前需先把專案根目錄加入 sys.path，例如:
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from llm_common.safe_calc import safe_eval
+"""
@@ -0,0 +1,165 @@
+"""LLM 請求的微批次排程器
+
+多個執行緒 (或協程) 同時呼叫模型時，排程器會在一個短暫的時間窗口內收集提示，
+整批同時送出，再把結果分送回各個呼叫者。
+Ollama 一次請求只處理一個提示 (LLM 的 batch() 也是逐一送出)，因此同一批的提示各自成為一個並行的請求；
+同時進行的批次數量受 max_concurrency 限制，同時送出的請求最多 max_concurrency * max_batch_size 個。
+
+注意：請求無法真正合併，排程器只比逐一送出的 batch() 快，不會比各自並行呼叫快，
+反而多了收集窗口的等待 (python -m llm_common.benchmarks batching：微批次的吞吐量
+約為各自並行呼叫的 0.76~1.0 倍)。因此各範例預設不使用，只在以 --batch-window 指定時啟用，
+需要限制同時請求數時用執行緒池或 semaphore 即可。
+
+    from llm_common.batching import batched
+
+    llm = batched(OllamaLLM(model="qwen2.5:0.5b"), window=0.01)
+    chain = prompt | llm | StrOutputParser()   # 用法與原本的 LLM 相同
+"""
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+
+class MicroBatcher:
+    """在 window 秒內收集最多 max_batch_size 個提示，整批同時送出"""
+
+    def __init__(self, llm, window: float = 0.01, max_batch_size: int = 16, max_concurrency: int = 4):
+        self.llm = llm
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-batch")
+        self._callers = ThreadPoolExecutor(max_workers=max_concurrency * max_batch_size, thread_name_prefix="llm-call")
+        # 限制同時進行的批次數，超過時新的提示留在佇列中繼續累積
+        self._slots = threading.Semaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._dispatcher.start()
+
+        self._batches = 0
+        self._requests = 0
+        self._total_wait = 0.0
+        self._max_batch_seen = 0
+
+    def submit(self, prompt: str, **kwargs: Any) -> Future:
+        """送出一個提示，返回之後會得到模型輸出的 Future"""
+        future: Future = Future()
+        self._queue.put((prompt, kwargs, future, time.perf_counter()))
+        return future
+
+    def invoke(self, prompt: str, **kwargs: Any) -> str:
+        """送出提示並等待結果"""
+        return self.submit(prompt, **kwargs).result()
+
+    async def ainvoke(self, prompt: str, **kwargs: Any) -> str:
+        """非同步送出提示並等待結果"""
+        return await asyncio.wrap_future(self.submit(prompt, **kwargs))
+
+    def _dispatch_loop(self):
+        while True:
+            first = self._queue.get()
+            self._slots.acquire()
+
+            # 收集時間窗口內 (且參數相同) 的提示
+            items = [first]
+            deadline = time.perf_counter() + self.window
+            while len(items) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item[1] != first[1]:
+                    # 參數不同的提示不能放在同一批，放回佇列等下一批
+                    self._queue.put(item)
+                    break
+                items.append(item)
+
+            self._executor.submit(self._run_batch, items)
+
+    def _run_batch(self, items: List[tuple]):
+        try:
+            now = time.perf_counter()
+            with self._lock:
+                self._batches += 1
+                self._requests += len(items)
+                self._total_wait += sum(now - item[3] for item in items)
+                self._max_batch_seen = max(self._max_batch_seen, len(items))
+
+            # 不使用 llm.batch()：它會一個接一個送出，同時呼叫的請求反而變成排隊
+            calls = [self._callers.submit(self.llm.invoke, prompt, **kwargs) for prompt, kwargs, _, _ in items]
+            for (_, _, future, _), call in zip(items, calls):
+                try:
+                    future.set_result(call.result())
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def metrics(self) -> Dict[str, float]:
+        """返回佇列深度、批次大小與等待時間等統計"""
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "requests": self._requests,
+                "avg_batch_size": self._requests / self._batches if self._batches else 0.0,
+                "max_batch_size": self._max_batch_seen,
+                "avg_wait_ms": self._total_wait / self._requests * 1000 if self._requests else 0.0,
+            }
+
+
+class BatchedLLM(LLM):
+    """把呼叫交給 MicroBatcher 的 LLM，可直接放進 LangChain 的處理鏈"""
+
+    batcher: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"batched-{self.batcher.llm._llm_type}"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Any = None, **kwargs: Any) -> str:
+        if stop is not None:
+            kwargs["stop"] = stop
+        return self.batcher.invoke(prompt, **kwargs)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None,
+                     run_manager: Any = None, **kwargs: Any) -> str:
+        if stop is not None:
+            kwargs["stop"] = stop
+        return await self.batcher.ainvoke(prompt, **kwargs)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        # 串流輸出無法合併成批次，直接交給內層模型
+        for chunk in self.batcher.llm.stream(prompt, stop=stop, **kwargs):
+            yield GenerationChunk(text=chunk)
+
+
+_batchers: Dict[int, MicroBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def shared_batcher(llm, **kwargs: Any) -> MicroBatcher:
+    """取得某個 LLM 物件共用的排程器 (同一個 LLM 只會建立一個)"""
+    with _batchers_lock:
+        batcher = _batchers.get(id(llm))
+        if batcher is None or batcher.llm is not llm:
+            batcher = _batchers[id(llm)] = MicroBatcher(llm, **kwargs)
+        return batcher
+
+
+def batched(llm, **kwargs: Any) -> BatchedLLM:
+    """把 LLM 包裝成經由共用排程器呼叫的 BatchedLLM"""
+    return BatchedLLM(batcher=shared_batcher(llm, **kwargs))
@@ -0,0 +1,428 @@
+"""llm_common 共用模組的效能基準測試
+
+用法 (在專案根目錄執行):
+    python -m llm_common.benchmarks [項目 ...]
+
+不指定項目時執行全部。
+"""
+import json
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_common.safe_calc import SafeCalculator
+from llm_common.stub_llm import StubLLM, PrefillStubLLM
+from llm_common.batching import MicroBatcher
+from llm_common.disk_cache import DiskCache, CachedLLM
+from llm_common.bounded_memory import BoundedConversationMemory
+from llm_common.summary_memory import BackgroundSummaryMemory
+from llm_common.stream_parsers import (JsonObjectScanner, StreamingJsonOutputParser, StreamingListOutputParser,
+                                      stream_parsed, stream_until_complete)
+
+
+def bench_safe_calc(rounds: int = 20000):
+    """比較 eval 與安全計算器 (含編譯快取與批次計算) 的速度"""
+    print("\n===== eval vs 安全計算器 =====")
+    expressions = ["23 * 7 + 15", "(345 + 678) / 3", "125 / 8", "2 ** 10 - 1", "sqrt(16) + 3 * 4"]
+    workload = [expressions[i % len(expressions)] for i in range(rounds)]
+    namespace = {"sqrt": __import__("math").sqrt, "__builtins__": {}}
+
+    start = time.perf_counter()
+    for expression in workload:
+        eval(expression, namespace)
+    eval_us = (time.perf_counter() - start) / rounds * 1e6
+
+    calculator = SafeCalculator(cache_size=0)
+    start = time.perf_counter()
+    for expression in workload:
+        calculator.evaluate(expression)
+    uncached_us = (time.perf_counter() - start) / rounds * 1e6
+
+    calculator = SafeCalculator()
+    start = time.perf_counter()
+    for expression in workload:
+        calculator.evaluate(expression)
+    cached_us = (time.perf_counter() - start) / rounds * 1e6
+    cache_info = calculator.cache_info()
+
+    # evaluate_many 沒有向量化，只是對重複的算式去重；分別量測全部不同與大量重複的情況
+    distinct = [f"{i} * 7 + {i % 97}" for i in range(rounds)]
+    calculator = SafeCalculator()
+    start = time.perf_counter()
+    calculator.evaluate_many(distinct)
+    distinct_us = (time.perf_counter() - start) / rounds * 1e6
+
+    calculator = SafeCalculator()
+    start = time.perf_counter()
+    calculator.evaluate_many(workload)
+    dedup_us = (time.perf_counter() - start) / rounds * 1e6
+    dedup_rate = 1 - len(set(workload)) / len(workload)
+
+    print(f"{'eval':<16}{eval_us:8.2f} µs/式")
+    print(f"{'安全計算 (無快取)':<12}{uncached_us:8.2f} µs/式")
+    print(f"{'安全計算 (快取)':<13}{cached_us:8.2f} µs/式  {cache_info}")
+    print(f"{'evaluate_many':<16}{distinct_us:8.2f} µs/式  ({rounds} 個不同算式)")
+    print(f"{'evaluate_many':<16}{dedup_us:8.2f} µs/式  (去重命中率 {dedup_rate:.2%}，只反映重複算式被略過)")
+
+    start = time.perf_counter()
+    try:
+        calculator.evaluate("9**9**9")
+    except ValueError as e:
+        print(f"9**9**9 在 {(time.perf_counter() - start) * 1e6:.1f} µs 內被拒絕: {e}")
+
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    """只回應 /api/generate 的模擬 Ollama 伺服器 (支援 keep-alive)"""
+
+    protocol_version = "HTTP/1.1"
+    wbufsize = 65536  # 標頭與內容一起送出，避免 Nagle 演算法造成的延遲
+    delay = 0.0       # 模擬模型處理每個請求的時間
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        time.sleep(self.delay)
+        body = json.dumps({"model": "stub", "response": "好的", "done": True}).encode("utf-8") + b"\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _fake_ollama(delay: float = 0.0) -> ThreadingHTTPServer:
+    """在背景啟動模擬 Ollama 伺服器 (每個請求各自一個執行緒，可同時處理)"""
+    handler = type("_DelayedOllamaHandler", (_FakeOllamaHandler,), {"delay": delay})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_batching(requests: int = 32, clients: int = 16, delay: float = 0.05):
+    """多個執行緒同時呼叫模型：各自呼叫 vs LLM 的 batch() vs 經由微批次排程器
+
+    連線到本機的模擬 Ollama 伺服器，每個請求需要 delay 秒，伺服器可同時處理多個請求。
+    """
+    from llm_common.llm_registry import get_llm
+
+    print(f"\n===== 各自呼叫 vs batch() vs 微批次 ({requests} 個提示，{clients} 個同時呼叫者，"
+          f"每個請求 {delay * 1000:.0f} ms) =====")
+    server = _fake_ollama(delay)
+    prompts = [f"問題 {i}" for i in range(requests)]
+    try:
+        llm = get_llm("stub-batching", base_url=f"http://127.0.0.1:{server.server_address[1]}")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            list(pool.map(llm.invoke, prompts))
+        direct = time.perf_counter() - start
+
+        start = time.perf_counter()
+        llm.batch(prompts)
+        serial = time.perf_counter() - start
+
+        batcher = MicroBatcher(llm, window=0.005)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            list(pool.map(batcher.invoke, prompts))
+        batched_time = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for name, elapsed in [("各自呼叫", direct), ("batch()", serial), ("微批次", batched_time)]:
+        print(f"{name:<8} {elapsed:6.2f}s  {requests / elapsed:7.1f} 提示/秒")
+    print(f"排程器統計: {batcher.metrics()}")
+    # 請求無法合併，微批次只是多了收集窗口的並行呼叫：與各自並行呼叫比較才是公平的基準
+    print(f"微批次相對各自呼叫: {direct / batched_time:.2f}x (相對 batch(): {serial / batched_time:.2f}x)")
+
+
+def bench_registry(calls: int = 200):
+    """每次呼叫都建立新的 LLM 物件 vs 經由註冊表共用物件與 keep-alive 連線池
+
+    連線到本機的模擬 Ollama 伺服器，量測的是每次呼叫在模型之外的固定開銷。
+    """
+    from langchain_ollama import OllamaLLM
+    from llm_common.llm_registry import get_llm, connection_stats
+
+    print(f"\n===== 每次新建 LLM vs 共用註冊表 ({calls} 次呼叫) =====")
+    server = _fake_ollama()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        start = time.perf_counter()
+        for _ in range(calls):
+            OllamaLLM(model="stub", base_url=base_url, temperature=0.7).invoke("你好")
+        fresh_ms = (time.perf_counter() - start) / calls * 1000
+
+        before = connection_stats()
+        start = time.perf_counter()
+        for _ in range(calls):
+            get_llm("stub", base_url=base_url, temperature=0.7).invoke("你好")
+        shared_ms = (time.perf_counter() - start) / calls * 1000
+        after = connection_stats()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(f"{'每次新建':<8} {fresh_ms:6.2f} ms/次 (每次建立新的客戶端與連線)")
+    print(f"{'共用註冊表':<7} {shared_ms:6.2f} ms/次，加速 {fresh_ms / shared_ms:.1f} 倍")
+    print(f"HTTP 請求 {after['requests'] - before['requests']} 次，"
+          f"新建連線 {after['new_connections'] - before['new_connections']} 次")
+
+
+def bench_disk_cache(latency: float = 0.2):
+    """重複執行課程範例：第一次呼叫模型，之後的執行 (新的快取連線) 直接讀取磁碟快取"""
+    print(f"\n===== 磁碟回應快取 (模擬模型每次 {latency * 1000:.0f} ms) =====")
+    prompts = ["什麼是人工智慧？", "請幫我寫一個關於智慧型手機的產品說明。",
+               "請給我30個關於Python程式設計的重點。", "請列出Python程式語言的三個主要特點，用逗號分隔"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "responses.sqlite"
+        for run in range(1, 4):
+            # 每次執行都開新的連線，模擬重新啟動腳本
+            cache = DiskCache(path)
+            llm = CachedLLM(llm=StubLLM(latency=latency), disk_cache=cache, force=True)
+            start = time.perf_counter()
+            for prompt in prompts:
+                llm.invoke(prompt)
+            elapsed = (time.perf_counter() - start) * 1000
+            stats = cache.stats()
+            print(f"第 {run} 次執行 {elapsed:8.1f} ms，命中 {stats['hits']}/{len(prompts)}，"
+                  f"累計命中率 {stats['total_hit_rate']:.0%}")
+            cache.close()  # 腳本結束時才把命中統計寫入資料庫
+
+        # 未強制時，temperature 未設定 (輸出不固定) 的模型不使用快取
+        cache = DiskCache(path)
+        CachedLLM(llm=StubLLM(latency=0), disk_cache=cache).invoke(prompts[0])
+        print(f"僅快取固定輸出模式: 略過 {cache.stats()['skipped']} 次")
+        cache.close()
+
+        # 大小上限：超過時刪除最久未使用的項目
+        cache = DiskCache(Path(tmp) / "small.sqlite", max_bytes=4096)
+        llm = CachedLLM(llm=StubLLM(latency=0, response="回" * 200), disk_cache=cache, force=True)
+        for i in range(50):
+            llm.invoke(f"問題 {i}")
+        stats = cache.stats()
+        print(f"上限 4 KB: 保留 {stats['entries']} 項 ({stats['bytes']} 位元組)，刪除 {stats['evictions']} 項")
+        cache.close()
+
+
+class _RamblingLLM(StubLLM):
+    """模擬小模型：JSON 前後夾雜說明文字，偶爾把 JSON 放在句子中間"""
+
+    def respond(self, prompt: str) -> str:
+        selection = '{"tool_name": "calculator", "tool_input": "125 / 8"}'
+        ramble = "\n這是因為問題涉及除法運算，所以計算機工具最適合。" * 4
+        return (f"好的，我選擇 {selection} 來回答。" if "#" in prompt else selection) + ramble
+
+
+def bench_structured(calls: int = 20, token_latency: float = 0.002):
+    """工具選擇：完整生成後再解析 vs 串流接收並在 JSON 物件結束時停止
+
+    模擬模型不理會 format 參數，每四次有一次把 JSON 放在句子中間。
+    """
+    from pydantic import BaseModel
+    from langchain_core.output_parsers import PydanticOutputParser
+
+    class ToolSelection(BaseModel):
+        tool_name: str
+        tool_input: str
+
+    print(f"\n===== 工具選擇的 JSON 解析 ({calls} 次，每個字元 {token_latency * 1000:.0f} ms) =====")
+    parser = PydanticOutputParser(pydantic_object=ToolSelection)
+    prompts = [f"問題 {i}" + ("#" if i % 4 == 0 else "") for i in range(calls)]
+
+    llm = _RamblingLLM(latency=0.01, token_latency=token_latency)
+    failures = wasted = 0
+    start = time.perf_counter()
+    for prompt in prompts:
+        text = llm.invoke(prompt)
+        scanner = JsonObjectScanner()
+        scanner.feed(text)
+        wasted += scanner.wasted
+        try:
+            parser.parse(text)
+        except Exception:
+            failures += 1
+    before = time.perf_counter() - start
+    print(f"{'完整生成後解析':<10} {before / calls * 1000:7.1f} ms/次，解析失敗 {failures} 次，多生成 {wasted} 字元")
+
+    failures = wasted = 0
+    start = time.perf_counter()
+    for prompt in prompts:
+        scanner = stream_until_complete(llm, prompt, JsonObjectScanner())
+        wasted += scanner.wasted
+        try:
+            ToolSelection.model_validate_json(scanner.text or "")
+        except ValueError:
+            failures += 1
+    after = time.perf_counter() - start
+    print(f"{'串流並提前停止':<10} {after / calls * 1000:7.1f} ms/次，解析失敗 {failures} 次，多生成 {wasted} 字元，"
+          f"加速 {before / after:.1f} 倍")
+
+
+class _ListRamblingLLM(StubLLM):
+    """模擬小模型：列出要求的項目或 JSON 後繼續說明"""
+
+    def respond(self, prompt: str) -> str:
+        ramble = "\n\n以上這些特點讓它非常受歡迎，以下逐一詳細說明。" * 3
+        if "JSON" in prompt:
+            return '{"name": "Python", "features": ["簡潔", "易讀", "生態豐富"], "description": "通用程式語言"}' + ramble
+        return "簡潔易讀, 豐富的函式庫, 跨平台, 動態型別, 社群活躍" + ramble
+
+
+def bench_stream_parsers(rounds: int = 5, token_latency: float = 0.002):
+    """列表與 JSON 解析：完整生成後解析 vs 串流解析並在結構完整時停止生成"""
+    from langchain_core.prompts import PromptTemplate
+    from langchain_core.output_parsers import CommaSeparatedListOutputParser, JsonOutputParser
+
+    print(f"\n===== 串流解析與提前停止 (每個字元 {token_latency * 1000:.0f} ms) =====")
+    prompt = PromptTemplate.from_template("{request}")
+    cases = [
+        ("列表 (要求 3 項)", "列出三個特點", CommaSeparatedListOutputParser(), StreamingListOutputParser(max_items=3)),
+        ("JSON", "請用 JSON 格式回答", JsonOutputParser(), StreamingJsonOutputParser()),
+    ]
+    for name, request, full_parser, streaming_parser in cases:
+        llm = _ListRamblingLLM(latency=0.01, token_latency=token_latency)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            try:
+                (prompt | llm | full_parser).invoke({"request": request})
+            except Exception:
+                pass  # 原本的 JSON 解析器遇到物件後的說明文字會失敗
+        before = (time.perf_counter() - start) / rounds * 1000
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            outputs = list(stream_parsed(prompt | llm | streaming_parser, {"request": request}))
+        after = (time.perf_counter() - start) / rounds * 1000
+        print(f"{name:<12} 完整生成 {before:7.1f} ms，串流提前停止 {after:7.1f} ms (加速 {before / after:.1f} 倍)，"
+              f"結果: {sum(outputs, []) if isinstance(streaming_parser, StreamingListOutputParser) else outputs[-1]}")
+
+
+class _ChatPrefillLLM(PrefillStubLLM):
+    """對話用的延遲隨提示長度增加的模擬模型；last_prompt_tokens 只記錄對話提示 (不含摘要)"""
+
+    def respond(self, prompt: str) -> str:
+        if "新的摘要" in prompt:
+            return "用戶叫小明，喜歡藍色，正在學習程式設計。"
+        return "好的，我記住了。請問還有什麼想聊的嗎？"
+
+    def _serve(self, prompts):
+        last = self.last_prompt_tokens
+        responses = super()._serve(prompts)
+        if any("新的摘要" in prompt for prompt in prompts):
+            self.last_prompt_tokens = last
+        return responses
+
+
+def bench_bounded_memory(turns: int = 500):
+    """ConversationBufferMemory vs BoundedConversationMemory：每輪提示 token 數與延遲"""
+    import warnings
+    from langchain.chains import ConversationChain
+    from langchain.memory import ConversationBufferMemory
+
+    warnings.filterwarnings("ignore")
+    print(f"\n===== 對話記憶 ({turns} 輪，模擬模型每個提示 token 2 µs) =====")
+    checkpoints = [1, 50, 100, 250, turns]
+    results = {}
+    for name, make_memory in [
+        ("完整記錄", lambda llm: ConversationBufferMemory()),
+        ("有上限的記憶", lambda llm: BoundedConversationMemory(llm=llm, max_token_limit=600)),
+    ]:
+        llm = _ChatPrefillLLM(latency=0.001)
+        memory = make_memory(llm)
+        conversation = ConversationChain(llm=llm, memory=memory)
+        rows = []
+        start_all = time.perf_counter()
+        for turn in range(1, turns + 1):
+            start = time.perf_counter()
+            conversation.predict(input=f"第 {turn} 輪：我今天學了 Python 的第 {turn} 個主題，想再多了解一些。")
+            if turn in checkpoints:
+                rows.append((turn, llm.last_prompt_tokens, (time.perf_counter() - start) * 1000))
+        results[name] = (rows, time.perf_counter() - start_all, memory)
+
+    print(f"{'輪次':<6}" + "".join(f"{name + ' tokens':>18}{'ms':>8}" for name in results))
+    for i, turn in enumerate(checkpoints):
+        print(f"{turn:<8}" + "".join(f"{rows[i][1]:>20}{rows[i][2]:>10.1f}" for rows, _, _ in results.values()))
+    for name, (_, total, memory) in results.items():
+        extra = f"，摘要更新 {memory.summary_updates} 次" if isinstance(memory, BoundedConversationMemory) else ""
+        print(f"{name}: 總耗時 {total:.1f}s{extra}")
+
+
+class _SlowSummaryLLM(StubLLM):
+    """摘要提示 (較長) 的處理時間是一般對話的 summary_factor 倍"""
+
+    summary_factor: float = 3.0
+
+    def _serve(self, prompts):
+        if any("summary" in prompt.lower() for prompt in prompts):
+            time.sleep(self.latency * (self.summary_factor - 1))
+        return super()._serve(prompts)
+
+
+def bench_summary_memory(turns: int = 20, latency: float = 0.05):
+    """ConversationSummaryMemory vs BackgroundSummaryMemory：每輪延遲與摘要呼叫次數
+
+    摘要呼叫比一般對話慢三倍，背景更新跟不上時會把多輪對話合併成一次摘要。
+    """
+    import warnings
+    from langchain.chains import ConversationChain
+    from langchain.memory import ConversationSummaryMemory
+
+    warnings.filterwarnings("ignore")
+    print(f"\n===== 摘要記憶 ({turns} 輪，模擬模型每次 {latency * 1000:.0f} ms) =====")
+    for name, memory_class in [("同步摘要", ConversationSummaryMemory), ("背景摘要", BackgroundSummaryMemory)]:
+        llm = _SlowSummaryLLM(latency=latency)
+        memory = memory_class(llm=llm)
+        conversation = ConversationChain(llm=llm, memory=memory)
+
+        start = time.perf_counter()
+        for turn in range(turns):
+            conversation.predict(input=f"第 {turn} 輪對話")
+        per_turn = (time.perf_counter() - start) / turns * 1000
+
+        start = time.perf_counter()
+        if isinstance(memory, BackgroundSummaryMemory):
+            memory.flush()
+            summary_calls = memory.summary_calls
+        else:
+            summary_calls = llm.calls - turns
+        flush_ms = (time.perf_counter() - start) * 1000
+        print(f"{name:<6} 每輪 {per_turn:6.1f} ms，摘要呼叫 {summary_calls:3d} 次，等待摘要完成 {flush_ms:6.1f} ms")
+
+
+BENCHMARKS = {
+    "safe_calc": bench_safe_calc,
+    "batching": bench_batching,
+    "registry": bench_registry,
+    "disk_cache": bench_disk_cache,
+    "structured": bench_structured,
+    "stream_parsers": bench_stream_parsers,
+    "bounded_memory": bench_bounded_memory,
+    "summary_memory": bench_summary_memory,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="llm_common 效能基準測試")
+    parser.add_argument("names", nargs="*", help=f"要執行的項目: {', '.join(BENCHMARKS)}")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的項目: {', '.join(unknown)}")
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
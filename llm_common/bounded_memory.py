@@ -0,0 +1,137 @@
+"""有上限的對話記憶
+
+ConversationBufferMemory 每一輪都會把完整的對話記錄放進提示，提示長度與延遲隨對話無限增長。
+BoundedConversationMemory 只保留 token 預算內的最近訊息 (放在固定長度的環形緩衝區)，
+較舊的訊息累積幾則後一次併入滾動摘要，提示長度因此維持在固定範圍內。
+
+    from llm_common.bounded_memory import BoundedConversationMemory
+
+    memory = BoundedConversationMemory(llm=llm, max_token_limit=1000)
+    conversation = ConversationChain(llm=llm, memory=memory)   # 用法與原本的記憶相同
+
+未提供 llm 時不呼叫模型，改為截取舊訊息的開頭作為摘要。
+"""
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from pydantic import PrivateAttr
+from langchain_core.memory import BaseMemory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, get_buffer_string
+
+from llm_common.tokens import estimate_tokens
+
+SUMMARY_PROMPT = """請逐步摘要以下對話，把新的對話內容併入現有摘要，保留人名、偏好與重要事實，只返回新的摘要。
+
+現有摘要:
+{summary}
+
+新的對話:
+{new_lines}
+
+新的摘要:"""
+
+
+class BoundedConversationMemory(BaseMemory):
+    """token 預算內的最近訊息 + 滾動摘要；可直接傳給 ConversationChain"""
+
+    llm: Optional[Any] = None
+    max_token_limit: int = 1000        # 提示中最近訊息的 token 預算
+    max_messages: int = 100            # 環形緩衝區最多保留的訊息數
+    summary_token_limit: int = 300     # 摘要的 token 上限
+    summary_batch: int = 10            # 累積幾則移出的訊息才更新一次摘要
+    memory_key: str = "history"
+    input_key: Optional[str] = None
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+    return_messages: bool = False
+    token_counter: Callable[[str], int] = estimate_tokens
+
+    summary: str = ""
+    summary_updates: int = 0
+
+    _buffer: Deque[Tuple[BaseMessage, int]] = PrivateAttr(default_factory=deque)
+    _buffer_tokens: int = PrivateAttr(default=0)
+    _pending: List[Tuple[BaseMessage, int]] = PrivateAttr(default_factory=list)
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """放進提示的訊息：緩衝區中的訊息，加上剩餘預算放得下的最新幾則待摘要訊息
+
+        待摘要的訊息也計入 max_token_limit；放不下的較舊訊息不會出現在提示中，
+        但仍會在下次更新時併入摘要。
+        """
+        budget = self.max_token_limit - self._buffer_tokens
+        start = len(self._pending)
+        while start > 0 and self._pending[start - 1][1] <= budget:
+            start -= 1
+            budget -= self._pending[start][1]
+        return [message for message, _ in self._pending[start:]] + [message for message, _ in self._buffer]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = self.messages
+        if self.return_messages:
+            if self.summary:
+                messages = [SystemMessage(content=self.summary)] + messages
+            return {self.memory_key: messages}
+
+        history = get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        if self.summary:
+            history = f"對話摘要: {self.summary}\n{history}"
+        return {self.memory_key: history}
+
+    def _input_text(self, inputs: Dict[str, Any]) -> str:
+        if self.input_key is not None:
+            return inputs[self.input_key]
+        keys = [key for key in inputs if key not in self.memory_variables and key != "stop"]
+        if len(keys) != 1:
+            raise ValueError(f"無法判斷輸入欄位，請指定 input_key (收到 {keys})")
+        return inputs[keys[0]]
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        output = outputs.get("response") or next(iter(outputs.values()))
+        for message in (HumanMessage(content=self._input_text(inputs)), AIMessage(content=output)):
+            tokens = self.token_counter(message.content)
+            self._buffer.append((message, tokens))
+            self._buffer_tokens += tokens
+
+        # 超過預算或數量上限時，最舊的訊息移出緩衝區，累積起來等待併入摘要
+        while self._buffer and (self._buffer_tokens > self.max_token_limit
+                                or len(self._buffer) > self.max_messages):
+            entry = self._buffer.popleft()
+            self._buffer_tokens -= entry[1]
+            self._pending.append(entry)
+
+        if len(self._pending) >= self.summary_batch:
+            self._update_summary()
+
+    def _update_summary(self):
+        """把累積的移出訊息一次併入摘要"""
+        new_lines = get_buffer_string([message for message, _ in self._pending],
+                                      human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        if self.llm is not None:
+            summary = self.llm.invoke(SUMMARY_PROMPT.format(summary=self.summary or "(無)", new_lines=new_lines))
+            summary = getattr(summary, "content", summary).strip()
+        else:
+            # 沒有模型時只保留每則訊息的開頭
+            lines = [line[:40] for line in new_lines.splitlines() if line.strip()]
+            summary = "\n".join(filter(None, [self.summary] + lines))
+
+        self.summary = self._truncate(summary)
+        self._pending = []
+        self.summary_updates += 1
+
+    def _truncate(self, summary: str) -> str:
+        """摘要超過上限時保留最新的部分"""
+        while summary and self.token_counter(summary) > self.summary_token_limit:
+            summary = summary[max(len(summary) // 10, 1):]
+        return summary
+
+    def clear(self) -> None:
+        self._buffer.clear()
+        self._buffer_tokens = 0
+        self._pending = []
+        self.summary = ""
@@ -0,0 +1,309 @@
+"""保存在磁碟上的 LLM 回應快取 (SQLite)
+
+以 (模型, temperature, 提示的 SHA-256) 為鍵，重複執行範例時相同的提示直接從快取返回。
+
+    from llm_common.disk_cache import cached
+
+    llm = cached(get_llm("qwen2.5:0.5b", temperature=0))
+
+預設只快取 temperature 為 0 的模型 (輸出固定)；temperature > 0 或未設定時每次結果不同，
+除非 force=True 或設定環境變數 LLM_CACHE=force，否則不使用快取。
+串流被 stream_parsed 等輔助函數提早關閉時，會在背景讀完剩餘的輸出再寫入快取。
+
+環境變數:
+    LLM_CACHE        off / deterministic (預設) / force
+    LLM_CACHE_PATH   快取檔位置，預設為 ~/.cache/llm_common/responses.sqlite
+
+查看命中率或清除快取:
+    python -m llm_common.disk_cache [--clear]
+"""
+import os
+import json
+import time
+import sqlite3
+import atexit
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+DEFAULT_PATH = Path.home() / ".cache" / "llm_common" / "responses.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    temperature REAL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class DiskCache:
+    """SQLite 回應快取；總大小超過 max_bytes 時刪除最久未使用的項目"""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = 64 * 1024 * 1024):
+        self.path = Path(path or os.getenv("LLM_CACHE_PATH") or DEFAULT_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            # WAL 模式讓多個範例同時執行時讀寫不互相阻塞
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+        # 本次執行的統計 (跨執行的累計值存在 counters 表)
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        # 尚未寫入 counters 表的次數，close() 時一次寫入，避免每次查詢都寫一次資料庫
+        self._pending = Counter()
+
+    @staticmethod
+    def make_key(model: str, temperature: Optional[float], prompt: str, **params: Any) -> str:
+        """以模型、temperature 與提示 (含 stop 等呼叫參數) 的雜湊作為快取鍵"""
+        payload = json.dumps([prompt, params], ensure_ascii=False, sort_keys=True, default=str)
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return f"{model}|{temperature}|{digest}"
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                self._pending["misses"] += 1
+                return None
+            self.hits += 1
+            self._pending["hits"] += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, model: str, temperature: Optional[float], response: str):
+        size = len(response.encode("utf-8")) + len(key)
+        if size > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, temperature, response, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, temperature, response, size, time.time()),
+            )
+            self._total += size - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def skip(self):
+        """記錄一次因輸出不固定而略過快取的呼叫"""
+        with self._lock:
+            self.skipped += 1
+            self._pending["skipped"] += 1
+
+    def flush(self):
+        """把累積的命中統計寫入 counters 表"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                [(name, count) for name, count in self._pending.items() if count])
+            self._pending.clear()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self):
+        """刪除最久未使用的項目，直到總大小降到 max_bytes 的九成以下"""
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._total <= target:
+                break
+            doomed.append((key,))
+            self._total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回本次執行與累計的命中統計，以及快取的項目數與大小"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            totals = Counter(dict(self._conn.execute("SELECT name, value FROM counters").fetchall()))
+            totals.update(self._pending)
+        lookups = self.hits + self.misses
+        total_lookups = totals.get("hits", 0) + totals.get("misses", 0)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "total_hits": totals.get("hits", 0),
+            "total_misses": totals.get("misses", 0),
+            "total_skipped": totals.get("skipped", 0),
+            "total_hit_rate": totals.get("hits", 0) / total_lookups if total_lookups else 0.0,
+            "entries": entries,
+            "bytes": self._total,
+        }
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.execute("DELETE FROM counters")
+            self._pending.clear()
+            self._total = 0
+
+
+def _describe(llm) -> tuple:
+    """取出 (模型名稱, temperature)；經由微批次排程器包裝的 LLM 會取內層模型的設定"""
+    inner = getattr(getattr(llm, "batcher", None), "llm", llm)
+    model = getattr(inner, "model", None) or getattr(inner, "model_name", None) or inner._llm_type
+    return str(model), getattr(inner, "temperature", None)
+
+
+class CachedLLM(LLM):
+    """先查磁碟快取，未命中才呼叫內層 LLM 並把結果寫入快取"""
+
+    llm: Any
+    disk_cache: Any
+    force: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cached-{self.llm._llm_type}"
+
+    def _key(self, prompt: str, stop: Optional[List[str]], kwargs: Dict[str, Any]) -> Optional[tuple]:
+        """返回 (快取鍵, 模型, temperature)；不應使用快取時返回 None"""
+        model, temperature = _describe(self.llm)
+        # temperature 未設定時 Ollama 使用預設值 (大於 0)，輸出同樣不固定
+        if not self.force and (temperature is None or temperature > 0):
+            self.disk_cache.skip()
+            return None
+        return self.disk_cache.make_key(model, temperature, prompt, stop=stop, **kwargs), model, temperature
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Any = None, **kwargs: Any) -> str:
+        entry = self._key(prompt, stop, kwargs)
+        if entry is not None:
+            cached_text = self.disk_cache.get(entry[0])
+            if cached_text is not None:
+                return cached_text
+
+        text = self.llm.invoke(prompt, stop=stop, **kwargs)
+        if entry is not None:
+            self.disk_cache.put(*entry, text)
+        return text
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None,
+                     run_manager: Any = None, **kwargs: Any) -> str:
+        entry = self._key(prompt, stop, kwargs)
+        if entry is not None:
+            cached_text = self.disk_cache.get(entry[0])
+            if cached_text is not None:
+                return cached_text
+
+        text = await self.llm.ainvoke(prompt, stop=stop, **kwargs)
+        if entry is not None:
+            self.disk_cache.put(*entry, text)
+        return text
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        entry = self._key(prompt, stop, kwargs)
+        if entry is not None:
+            cached_text = self.disk_cache.get(entry[0])
+            if cached_text is not None:
+                yield GenerationChunk(text=cached_text)
+                return
+
+        parts = []
+        stream = self.llm.stream(prompt, stop=stop, **kwargs)
+        try:
+            for chunk in stream:
+                parts.append(chunk)
+                yield GenerationChunk(text=chunk)
+        except GeneratorExit:
+            # stream_parsed / stream_until_complete 取得完整結構後會提早關閉串流；
+            # 可快取時在背景執行緒讀完剩餘輸出再寫入，呼叫端不必等待，下次執行即可命中
+            if entry is not None:
+                threading.Thread(target=self._drain, args=(stream, parts, entry),
+                                 name="cache-drain").start()
+            else:
+                stream.close()
+            raise
+        if entry is not None:
+            self.disk_cache.put(*entry, "".join(parts))
+
+    def _drain(self, stream: Iterator[str], parts: List[str], entry: tuple):
+        """讀完提早關閉的串流並寫入快取 (非 daemon 執行緒，程式結束前會等它完成)"""
+        try:
+            parts.extend(stream)
+        except Exception:
+            return
+        self.disk_cache.put(*entry, "".join(parts))
+
+
+_default_cache: Optional[DiskCache] = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> DiskCache:
+    """所有範例共用的快取 (位置由 LLM_CACHE_PATH 決定)"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = DiskCache()
+            # 程式結束時寫入累積的統計
+            atexit.register(_default_cache.close)
+        return _default_cache
+
+
+def cached(llm, cache: Optional[DiskCache] = None, force: Optional[bool] = None):
+    """把 LLM 包裝成使用磁碟快取的 CachedLLM；LLM_CACHE=off 時原樣返回"""
+    mode = os.getenv("LLM_CACHE", "deterministic").lower()
+    if mode == "off":
+        return llm
+    if force is None:
+        force = mode == "force"
+    return CachedLLM(llm=llm, disk_cache=cache or default_cache(), force=force)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 磁碟快取的統計與維護")
+    parser.add_argument("--clear", action="store_true", help="清除所有快取項目與統計")
+    args = parser.parse_args()
+
+    cache = default_cache()
+    if args.clear:
+        cache.clear()
+        print(f"已清除 {cache.path}")
+        return
+
+    stats = cache.stats()
+    print(f"快取檔: {cache.path}")
+    print(f"項目數: {stats['entries']}，大小: {stats['bytes'] / 1024:.1f} KB")
+    print(f"累計命中 {stats['total_hits']} 次，未命中 {stats['total_misses']} 次，"
+          f"略過 {stats['total_skipped']} 次 (命中率 {stats['total_hit_rate']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
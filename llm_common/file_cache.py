@@ -0,0 +1,180 @@
+"""以檔案內容為鍵的結果快取 (SQLite)
+
+鍵為檔案內容的 SHA-256 加上修改時間，分成兩層：
+    text    取出的文字內容 (含檔案類型)，省下類型偵測與 PDF/DOCX 解析
+    report  最終的 LLM 分析報告，鍵另外包含分析設定 (模型、分段參數、提示模板)
+
+    from llm_common.file_cache import FileCache
+
+    cache = FileCache()
+    key = cache.file_key("report.pdf")
+    text = cache.get("text", key)
+    if text is None:
+        cache.put("text", key, {"file_type": ..., "content": ...}, "report.pdf")
+
+路徑、大小與修改時間都沒變的檔案直接沿用上次算出的雜湊，不必重新讀取整個檔案。
+每一層的總大小超過上限時刪除最久未使用的項目。
+
+環境變數:
+    FILE_CACHE_PATH  快取檔位置，預設為 ~/.cache/llm_common/files.sqlite
+
+查看或清除快取:
+    python -m llm_common.file_cache [--clear]
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+DEFAULT_PATH = Path.home() / ".cache" / "llm_common" / "files.sqlite"
+
+# 各層的大小上限 (位元組)
+TIER_LIMITS = {"text": 256 * 1024 * 1024, "report": 32 * 1024 * 1024}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    tier TEXT NOT NULL,
+    key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (tier, key)
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (tier, last_used);
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+
+def sha256_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileCache:
+    """取出內容與分析報告的兩層快取；各層總大小超過上限時刪除最久未使用的項目"""
+
+    def __init__(self, path: Optional[str] = None, limits: Optional[Dict[str, int]] = None):
+        self.path = Path(path or os.getenv("FILE_CACHE_PATH") or DEFAULT_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.limits = dict(TIER_LIMITS, **(limits or {}))
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._totals = dict(self._conn.execute("SELECT tier, SUM(size) FROM entries GROUP BY tier").fetchall())
+
+        # 本次執行的統計
+        self.hits = {tier: 0 for tier in self.limits}
+        self.misses = {tier: 0 for tier in self.limits}
+        self.evictions = 0
+
+    def file_key(self, file_path: str) -> str:
+        """檔案內容的 SHA-256 加上修改時間；路徑、大小與修改時間都沒變時沿用記錄的雜湊"""
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, sha256 FROM hashes WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            digest = row[2]
+        else:
+            digest = sha256_file(path)
+            with self._lock, self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                                   (path, stat.st_size, stat.st_mtime_ns, digest))
+        return f"{digest}|{stat.st_mtime_ns}"
+
+    def get(self, tier: str, key: str) -> Optional[Any]:
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM entries WHERE tier = ? AND key = ?", (tier, key)).fetchone()
+            if row is None:
+                self.misses[tier] += 1
+                return None
+            self.hits[tier] += 1
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE tier = ? AND key = ?", (time.time(), tier, key))
+            return json.loads(row[0])
+
+    def put(self, tier: str, key: str, value: Any, file_path: str):
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8")) + len(key)
+        if size > self.limits[tier]:
+            return
+        with self._lock, self._conn:
+            old = self._conn.execute("SELECT size FROM entries WHERE tier = ? AND key = ?", (tier, key)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (tier, key, path, value, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (tier, key, os.path.abspath(file_path), data, size, time.time()),
+            )
+            self._totals[tier] = self._totals.get(tier, 0) + size - (old[0] if old else 0)
+            if self._totals[tier] > self.limits[tier]:
+                self._evict(tier)
+
+    def _evict(self, tier: str):
+        """刪除該層最久未使用的項目，直到總大小降到上限的九成以下"""
+        target = self.limits[tier] * 0.9
+        rows = self._conn.execute("SELECT key, size FROM entries WHERE tier = ? ORDER BY last_used", (tier,)).fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._totals[tier] <= target:
+                break
+            doomed.append((tier, key))
+            self._totals[tier] -= size
+        self._conn.executemany("DELETE FROM entries WHERE tier = ? AND key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        """各層的項目數、大小與本次執行的命中次數"""
+        with self._lock:
+            entries = dict(self._conn.execute("SELECT tier, COUNT(*) FROM entries GROUP BY tier").fetchall())
+        return {
+            tier: {
+                "entries": entries.get(tier, 0),
+                "bytes": self._totals.get(tier, 0),
+                "hits": self.hits[tier],
+                "misses": self.misses[tier],
+            }
+            for tier in self.limits
+        }
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM hashes")
+            self._totals = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="檔案結果快取的統計與維護")
+    parser.add_argument("--clear", action="store_true", help="清除所有快取項目")
+    args = parser.parse_args()
+
+    cache = FileCache()
+    if args.clear:
+        cache.clear()
+        print(f"已清除 {cache.path}")
+        return
+
+    print(f"快取檔: {cache.path}")
+    for tier, stats in cache.stats().items():
+        print(f"{tier:<7} 項目數: {stats['entries']}，大小: {stats['bytes'] / 1024:.1f} KB "
+              f"(上限 {cache.limits[tier] / 1024 / 1024:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
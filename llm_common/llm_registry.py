@@ -0,0 +1,121 @@
+"""全程序共用的 Ollama LLM 註冊表
+
+以 (模型, base_url, 參數) 為鍵快取 LLM 物件，相同設定只建立一次；
+同一個 base_url 的所有 LLM 共用一個保持連線 (keep-alive) 的 HTTP 連線池，
+連續呼叫時不需重新建立連線。
+
+    from llm_common.llm_registry import get_llm
+
+    llm = get_llm("qwen2.5:0.5b", temperature=0.7, warm=True)
+
+有安裝 langchain-ollama 時使用 OllamaLLM (httpx 連線池)；
+否則退回 langchain_community 的 Ollama，此時只共用物件，無法共用連線。
+"""
+import os
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import httpx
+    from langchain_ollama import OllamaLLM
+except ImportError:  # 沒有安裝 langchain-ollama
+    OllamaLLM = None
+    from langchain_community.llms import Ollama
+
+DEFAULT_BASE_URL = "http://localhost:11434"
+
+_lock = threading.Lock()
+_llms: Dict[Tuple[str, str, str], Any] = {}
+_transports: Dict[str, Any] = {}
+_stats = {"requests": 0, "new_connections": 0, "warmups": 0, "llms_created": 0, "llm_reuses": 0}
+
+
+def _trace(event_name: str, info: Dict[str, Any]):
+    """httpcore 的追蹤回呼：只有建立新連線時才會收到 connect_tcp 事件"""
+    if event_name == "connection.connect_tcp.complete":
+        with _lock:
+            _stats["new_connections"] += 1
+
+
+def _on_request(request: "httpx.Request"):
+    request.extensions["trace"] = _trace
+    with _lock:
+        _stats["requests"] += 1
+
+
+def _shared_transport(base_url: str) -> "httpx.HTTPTransport":
+    """同一個 base_url 共用的 httpx 連線池"""
+    with _lock:
+        transport = _transports.get(base_url)
+        if transport is None:
+            transport = _transports[base_url] = httpx.HTTPTransport(
+                limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=300))
+        return transport
+
+
+def _pool_kwargs(base_url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """加上共用連線池的 sync_client_kwargs (呼叫端自己指定的項目優先)"""
+    return {"transport": _shared_transport(base_url), "event_hooks": {"request": [_on_request]},
+            **(params.get("sync_client_kwargs") or {})}
+
+
+def get_llm(model: str, base_url: Optional[str] = None, warm: bool = False, **params: Any):
+    """取得共用的 LLM 物件，參數與 OllamaLLM 相同 (例如 temperature)
+
+    warm 為 True 時，第一次建立後會在背景預先載入模型，減少第一次呼叫的等待。
+    """
+    base_url = base_url or os.getenv("OLLAMA_BASE_URL") or DEFAULT_BASE_URL
+    key = (model, base_url, json.dumps(params, sort_keys=True, default=str))
+
+    with _lock:
+        llm = _llms.get(key)
+        if llm is not None:
+            _stats["llm_reuses"] += 1
+            return llm
+
+    if OllamaLLM is not None:
+        # 共用連線池經由 sync_client_kwargs 傳入，客戶端仍由 OllamaLLM 依 base_url (含其中的認證資訊)
+        # 與 client_kwargs 建立 (非同步客戶端與事件迴圈綁定，維持每個物件各自一個)
+        llm = OllamaLLM(model=model, base_url=base_url,
+                        **dict(params, sync_client_kwargs=_pool_kwargs(base_url, params)))
+    else:
+        llm = Ollama(model=model, base_url=base_url, **params)
+
+    with _lock:
+        # 其他執行緒可能同時建立了相同設定的物件，以先建立者為準
+        existing = _llms.get(key)
+        if existing is not None:
+            _stats["llm_reuses"] += 1
+            return existing
+        _llms[key] = llm
+        _stats["llms_created"] += 1
+
+    if warm:
+        threading.Thread(target=warm_up, args=(llm,), daemon=True).start()
+    return llm
+
+
+def warm_up(llm, keep_alive: str = "30m") -> bool:
+    """請 Ollama 預先把模型載入記憶體 (空白提示不會生成任何內容)
+
+    經由 llm 自己的客戶端送出，與之後的呼叫使用相同的認證標頭與連線池。
+    """
+    client = getattr(llm, "_client", None)
+    if OllamaLLM is None or client is None:
+        return False
+    try:
+        client.generate(model=llm.model, prompt="", keep_alive=keep_alive)
+    except Exception:
+        return False  # 伺服器尚未啟動時略過，第一次呼叫時才載入
+    with _lock:
+        _stats["warmups"] += 1
+    return True
+
+
+def connection_stats() -> Dict[str, int]:
+    """返回 HTTP 請求數、新建連線數與重用的連線數"""
+    with _lock:
+        stats = dict(_stats)
+    stats["reused_connections"] = max(stats["requests"] - stats["new_connections"], 0)
+    return stats
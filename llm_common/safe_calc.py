@@ -0,0 +1,215 @@
+"""安全的算式計算器
+
+以 AST 解析算式，只允許白名單內的運算子、常數與函數，
+並限制運算元、次方、round 位數與語法樹深度，避免 `9**9**9`、`round(1, -10**9)`
+或深度巢狀的算式耗盡 CPU、記憶體或遞迴深度。
+解析後的算式會編譯成巢狀的 Python 函數並以 LRU 快取，重複的算式不需重新解析。
+"""
+import ast
+import math
+import operator
+from functools import lru_cache
+from typing import Callable, Iterable, List, Union
+
+Number = Union[int, float]
+
+
+class CalculationError(ValueError):
+    """算式不合法或超出允許範圍"""
+
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+_CONSTANTS = {
+    "pi": math.pi,
+    "e": math.e,
+}
+
+_MAX_ROUND_DIGITS = 100
+
+
+def _round(value: Number, ndigits: int = None) -> Number:
+    """限制位數的 round：過大的 ndigits 會讓整數 round 計算 10**ndigits 而卡住"""
+    if ndigits is not None and isinstance(ndigits, int) and abs(ndigits) > _MAX_ROUND_DIGITS:
+        raise CalculationError(f"round 的位數超過上限 {_MAX_ROUND_DIGITS}")
+    if ndigits is None:
+        return round(value)
+    return round(value, ndigits)
+
+
+_FUNCTIONS = {
+    "abs": abs,
+    "round": _round,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "log": math.log,
+    "log10": math.log10,
+    "exp": math.exp,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+}
+
+
+class SafeCalculator:
+    """以白名單 AST 計算算式，並快取編譯結果
+
+    max_bits 限制整數運算結果的位元數，max_exponent 限制次方的指數，
+    max_length 限制算式字串長度，max_depth 限制語法樹深度，cache_size 為編譯快取的容量。
+    """
+
+    def __init__(self, max_bits: int = 4096, max_exponent: int = 10000,
+                 max_length: int = 1000, max_depth: int = 100, cache_size: int = 1024):
+        self.max_bits = max_bits
+        self.max_exponent = max_exponent
+        self.max_length = max_length
+        self.max_depth = max_depth
+        self._compile = lru_cache(maxsize=cache_size)(self._compile_uncached)
+
+    def evaluate(self, expression: str) -> Number:
+        """計算單一算式"""
+        return self.compile(expression)()
+
+    def evaluate_many(self, expressions: Iterable[str]) -> List[Union[Number, CalculationError]]:
+        """批次計算多個算式
+
+        相同的算式只編譯與計算一次；計算失敗的位置放入 CalculationError 而不中斷整批。
+        """
+        results = {}
+        output = []
+        for expression in expressions:
+            if expression not in results:
+                try:
+                    results[expression] = self.evaluate(expression)
+                except CalculationError as e:
+                    results[expression] = e
+            output.append(results[expression])
+        return output
+
+    def compile(self, expression: str) -> Callable[[], Number]:
+        """把算式編譯成不需參數的函數 (結果會被快取)"""
+        if not isinstance(expression, str):
+            raise CalculationError("算式必須是字串")
+        expression = expression.strip()
+        if len(expression) > self.max_length:
+            raise CalculationError(f"算式過長 (超過 {self.max_length} 個字元)")
+        return self._compile(expression)
+
+    def cache_info(self):
+        """返回編譯快取的統計資訊"""
+        return self._compile.cache_info()
+
+    def _compile_uncached(self, expression: str) -> Callable[[], Number]:
+        try:
+            tree = ast.parse(expression, mode="eval")
+        except SyntaxError as e:
+            raise CalculationError(f"算式語法錯誤: {e.msg}") from None
+        except (RecursionError, MemoryError):
+            raise CalculationError("算式巢狀過深") from None
+        self._check_depth(tree.body)
+        return self._build(tree.body)
+
+    def _check_depth(self, root: ast.AST):
+        """以迭代方式檢查語法樹深度，避免 _build 與計算時遞迴過深"""
+        stack = [(root, 1)]
+        while stack:
+            node, depth = stack.pop()
+            if depth > self.max_depth:
+                raise CalculationError(f"算式巢狀超過 {self.max_depth} 層")
+            stack.extend((child, depth + 1) for child in ast.iter_child_nodes(node))
+
+    def _build(self, node: ast.AST) -> Callable[[], Number]:
+        """把 AST 節點轉成函數，遇到不在白名單內的語法即拒絕"""
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise CalculationError(f"不支援的常數: {node.value!r}")
+            value = self._check(node.value)
+            return lambda: value
+
+        if isinstance(node, ast.Name):
+            if node.id not in _CONSTANTS:
+                raise CalculationError(f"不支援的名稱: {node.id}")
+            value = _CONSTANTS[node.id]
+            return lambda: value
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+            op = _UNARY_OPERATORS[type(node.op)]
+            operand = self._build(node.operand)
+            return lambda: op(operand())
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            op_type = type(node.op)
+            op = _BINARY_OPERATORS[op_type]
+            left, right = self._build(node.left), self._build(node.right)
+            if op_type is ast.Pow:
+                return lambda: self._power(left(), right())
+            if op_type is ast.Mult:
+                return lambda: self._multiply(left(), right())
+            return lambda: self._apply(op, left(), right())
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+                and node.func.id in _FUNCTIONS and not node.keywords:
+            func = _FUNCTIONS[node.func.id]
+            args = [self._build(arg) for arg in node.args]
+            return lambda: self._apply(func, *[arg() for arg in args])
+
+        raise CalculationError(f"不支援的語法: {type(node).__name__}")
+
+    def _apply(self, func: Callable, *args: Number) -> Number:
+        try:
+            return self._check(func(*args))
+        except CalculationError:
+            raise
+        except (ArithmeticError, ValueError, TypeError) as e:
+            raise CalculationError(str(e) or type(e).__name__) from None
+        except (RecursionError, MemoryError) as e:
+            raise CalculationError(f"計算資源不足: {type(e).__name__}") from None
+
+    def _multiply(self, left: Number, right: Number) -> Number:
+        if isinstance(left, int) and isinstance(right, int) \
+                and left.bit_length() + right.bit_length() > self.max_bits:
+            raise CalculationError(f"運算結果超過 {self.max_bits} 位元")
+        return self._apply(operator.mul, left, right)
+
+    def _power(self, base: Number, exponent: Number) -> Number:
+        if abs(exponent) > self.max_exponent:
+            raise CalculationError(f"指數超過上限 {self.max_exponent}")
+        if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 \
+                and abs(base) > 1 and (abs(base).bit_length() - 1) * exponent > self.max_bits:
+            raise CalculationError(f"運算結果超過 {self.max_bits} 位元")
+        return self._apply(operator.pow, base, exponent)
+
+    def _check(self, value: Number) -> Number:
+        """檢查結果型別與大小"""
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise CalculationError(f"不支援的結果型別: {type(value).__name__}")
+        if isinstance(value, int) and value.bit_length() > self.max_bits:
+            raise CalculationError(f"運算結果超過 {self.max_bits} 位元")
+        return value
+
+
+_default_calculator = SafeCalculator()
+
+
+def safe_eval(expression: str) -> Number:
+    """以預設設定安全地計算算式"""
+    return _default_calculator.evaluate(expression)
+
+
+def evaluate_many(expressions: Iterable[str]) -> List[Union[Number, CalculationError]]:
+    """以預設設定批次計算多個算式"""
+    return _default_calculator.evaluate_many(expressions)
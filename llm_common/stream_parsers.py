@@ -0,0 +1,260 @@
+"""串流輸出的增量解析器
+
+小模型常在 JSON 物件結束後繼續生成說明文字。這裡的解析器逐段接收串流輸出，
+一旦結構完整就停止讀取，關閉串流後 Ollama 也會停止生成，省下多餘的解碼時間。
+
+    from llm_common.stream_parsers import JsonObjectScanner, stream_until_complete
+
+    scanner = stream_until_complete(llm, prompt, JsonObjectScanner(), format=schema)
+    data = json.loads(scanner.text)
+
+處理鏈的最後一步是這裡的解析器時，用 stream_parsed() 逐項取得結果：
+
+    chain = prompt | llm | StreamingListOutputParser(max_items=3)
+    for items in stream_parsed(chain, {"topic": "Python"}):
+        print(items[0])
+
+(直接呼叫 chain.stream() 也能逐項取得結果，但 LangChain 為了記錄輸入，
+會在解析器停止後繼續讀完模型的輸出，無法提前停止生成。)
+"""
+import re
+from typing import Any, Iterator, List, Optional, Union
+
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import CommaSeparatedListOutputParser, JsonOutputParser
+from langchain_core.runnables import RunnableSequence
+from langchain_core.utils.json import parse_partial_json
+
+
+class JsonObjectScanner:
+    """找出輸出中第一個完整的 JSON 物件 (追蹤大括號深度與字串內的跳脫字元)"""
+
+    def __init__(self):
+        self.received = ""  # 目前收到的全部文字
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        return self.end is not None
+
+    @property
+    def text(self) -> Optional[str]:
+        """完整的 JSON 物件文字；尚未完整時為 None"""
+        return self.received[self.start:self.end] if self.done else None
+
+    @property
+    def wasted(self) -> int:
+        """物件結束後多收到的字元數"""
+        return len(self.received) - self.end if self.done else 0
+
+    def feed(self, chunk: str) -> bool:
+        """加入一段輸出，物件完整時返回 True"""
+        offset = len(self.received)
+        self.received += chunk
+        if self.done:
+            return True
+
+        for i, char in enumerate(chunk, offset):
+            if self.start is None:
+                if char == "{":
+                    self.start = i
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = i + 1
+                    return True
+        return False
+
+
+_BULLET = re.compile(r"\s*(?:[-*•·]\s+|\d+[.)]\s+|\d+、\s*)")
+
+
+def _unquote(field: str) -> str:
+    """去掉 csv 風格的引號 (與 CommaSeparatedListOutputParser 相同，"" 代表一個引號)"""
+    field = field.strip()
+    if len(field) >= 2 and field[0] == field[-1] == '"':
+        field = field[1:-1].replace('""', '"')
+    return field
+
+
+class ListScanner:
+    """逐段切出列表項目；達到 max_items 個項目時視為列表結束
+
+    支援逗號分隔 (引號內的逗號不切開)、每行一項以及 -、*、1. 等項目符號 (一行一項)；
+    列表開始前以冒號結尾的說明行 (例如「以下是三個特點：」) 會被略過。
+    """
+
+    def __init__(self, max_items: Optional[int] = None):
+        self.max_items = max_items
+        self.items: List[str] = []
+        self.received = ""
+        self.end: Optional[int] = None
+        self._line = ""          # 目前這一行已收到的文字
+        self._field_start = 0    # 目前項目在這一行中的起點
+        self._in_quote = False
+
+    @property
+    def done(self) -> bool:
+        return self.end is not None
+
+    @property
+    def wasted(self) -> int:
+        """列表結束後多收到的字元數"""
+        return len(self.received) - self.end if self.done else 0
+
+    def _add(self, item: str, position: int) -> Optional[str]:
+        item = _unquote(item)
+        if not item:
+            return None
+        self.items.append(item)
+        if self.max_items is not None and len(self.items) >= self.max_items:
+            self.end = position
+        return item
+
+    def _end_line(self, position: int) -> Optional[str]:
+        """一行結束：項目符號行整行是一個項目，列表前以冒號結尾的說明行略過"""
+        line, field, whole_line = self._line, self._line[self._field_start:], self._field_start == 0
+        self._line, self._field_start, self._in_quote = "", 0, False
+        bullet = _BULLET.match(line)
+        if bullet:
+            return self._add(line[bullet.end():], position)
+        if not self.items and whole_line and line.strip(" *#").endswith((":", "：")):
+            return None
+        return self._add(field, position)
+
+    def feed(self, chunk: str) -> List[str]:
+        """加入一段輸出，返回這段輸出中新完成的項目"""
+        offset = len(self.received)
+        self.received += chunk
+        completed = []
+        for i, char in enumerate(chunk, offset):
+            if self.done:
+                break
+            item = None
+            if char == "\n":
+                # 換行一定結束這一行 (沒有成對的引號不會吞掉之後的所有輸出)
+                item = self._end_line(i + 1)
+            elif char == '"':
+                self._in_quote = not self._in_quote
+                self._line += char
+            elif self._in_quote:
+                self._line += char
+            elif char == "," and not _BULLET.match(self._line):
+                item = self._add(self._line[self._field_start:], i + 1)
+                self._line += char
+                self._field_start = len(self._line)
+            else:
+                self._line += char
+            if item is not None:
+                completed.append(item)
+        return completed
+
+    def finish(self) -> List[str]:
+        """輸出結束時返回最後一個尚未以分隔符號結尾的項目"""
+        if self.done:
+            return []
+        item = self._end_line(len(self.received))
+        self.end = len(self.received)
+        return [item] if item is not None else []
+
+
+def _chunk_text(chunk: Union[str, BaseMessage]) -> str:
+    if isinstance(chunk, BaseMessage):
+        return chunk.content if isinstance(chunk.content, str) else ""
+    return chunk
+
+
+class StreamingListOutputParser(CommaSeparatedListOutputParser):
+    """串流時每完成一個項目就輸出，列表結束或達到 max_items 時停止讀取 (模型隨即停止生成)"""
+
+    max_items: Optional[int] = None
+
+    def parse(self, text: str) -> List[str]:
+        scanner = ListScanner(self.max_items)
+        return scanner.feed(text) + scanner.finish()
+
+    def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[List[str]]:
+        return self.iter_parse(input)
+
+    def iter_parse(self, chunks: Iterator[Union[str, BaseMessage]]) -> Iterator[List[str]]:
+        """逐段解析模型輸出，每完成一個項目就輸出 [項目]，列表結束時停止讀取"""
+        scanner = ListScanner(self.max_items)
+        for chunk in chunks:
+            for item in scanner.feed(_chunk_text(chunk)):
+                yield [item]
+            if scanner.done:
+                return
+        for item in scanner.finish():
+            yield [item]
+
+
+class StreamingJsonOutputParser(JsonOutputParser):
+    """串流時輸出逐漸完整的 JSON 物件，物件結束時停止讀取，忽略之後多生成的文字"""
+
+    def parse(self, text: str) -> Any:
+        scanner = JsonObjectScanner()
+        scanner.feed(text)
+        return super().parse(scanner.text if scanner.done else text)
+
+    def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[Any]:
+        return self.iter_parse(input)
+
+    def iter_parse(self, chunks: Iterator[Union[str, BaseMessage]]) -> Iterator[Any]:
+        """逐段解析模型輸出，每當物件多了新的欄位或內容就輸出目前的物件，物件結束時停止讀取"""
+        scanner = JsonObjectScanner()
+        previous = None
+        for chunk in chunks:
+            scanner.feed(_chunk_text(chunk))
+            if scanner.start is None:
+                continue
+            try:
+                partial = parse_partial_json(scanner.text if scanner.done else scanner.received[scanner.start:])
+            except ValueError:
+                partial = None
+            if partial is not None and partial != previous:
+                previous = partial
+                yield partial
+            if scanner.done:
+                return
+
+
+def stream_until_complete(llm, prompt: Any, scanner, **kwargs: Any):
+    """串流呼叫 llm，scanner 判斷結構完整時立即關閉串流 (停止生成)，返回 scanner"""
+    stream = llm.stream(prompt, **kwargs)
+    try:
+        for chunk in stream:
+            if scanner.feed(chunk):
+                break
+    finally:
+        stream.close()
+    return scanner
+
+
+def stream_parsed(chain, inputs: Any, **kwargs: Any) -> Iterator[Any]:
+    """串流執行最後一步為 Streaming*OutputParser 的處理鏈，結構完整時關閉串流 (停止生成)"""
+    steps = chain.steps
+    parser = steps[-1]
+    upstream = steps[0] if len(steps) == 2 else RunnableSequence(*steps[:-1])
+
+    stream = upstream.stream(inputs, **kwargs)
+    try:
+        yield from parser.iter_parse(stream)
+    finally:
+        stream.close()
@@ -0,0 +1,116 @@
+"""基準測試用的模擬 LLM
+
+不需要啟動 Ollama 即可重現模型伺服器的延遲特性：
+每個請求的固定開銷 (latency)、每個提示的處理時間 (per_prompt_latency)、
+逐 token 生成的時間 (token_latency)，以及一次只能處理一個請求的伺服器 (serialize)。
+與 Ollama 相同，一次請求只處理一個提示，batch() 會逐一送出。
+PrefillStubLLM 另外模擬處理提示的時間 (隨提示長度增加) 與模型的 context 上限。
+"""
+import time
+import asyncio
+import threading
+from typing import Any, Iterator, List, Optional
+
+from pydantic import PrivateAttr
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
+
+from llm_common.tokens import estimate_tokens
+
+
+class StubLLM(LLM):
+    """依設定延遲後回傳固定內容的 LLM；子類別可覆寫 respond() 依提示決定回應"""
+
+    latency: float = 0.05
+    per_prompt_latency: float = 0.0
+    token_latency: float = 0.0
+    serialize: bool = False
+    response: str = "這是模擬的回答。"
+    calls: int = 0      # 請求次數
+    prompts: int = 0    # 處理過的提示數
+
+    _server_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _count_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def respond(self, prompt: str) -> str:
+        return self.response
+
+    def _serve(self, prompts: List[str]) -> List[str]:
+        """模擬伺服器處理一個請求 (可包含多個提示)"""
+        lock = self._server_lock if self.serialize else None
+        if lock is not None:
+            lock.acquire()
+        try:
+            time.sleep(self.latency + self.per_prompt_latency * len(prompts))
+            responses = [self.respond(prompt) for prompt in prompts]
+            time.sleep(self.token_latency * max(len(r) for r in responses))
+        finally:
+            if lock is not None:
+                lock.release()
+
+        with self._count_lock:
+            self.calls += 1
+            self.prompts += len(prompts)
+        return responses
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Any = None, **kwargs: Any) -> str:
+        return self._serve([prompt])[0]
+
+    def _generate(self, prompts: List[str], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> LLMResult:
+        # 與 langchain_ollama 相同：每個提示各是一次請求，依序送出
+        return LLMResult(generations=[[Generation(text=self._serve([prompt])[0])] for prompt in prompts])
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        time.sleep(self.latency)
+        text = self.respond(prompt)
+        with self._count_lock:
+            self.calls += 1
+            self.prompts += 1
+        for char in text:
+            time.sleep(self.token_latency)
+            yield GenerationChunk(text=char)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None,
+                     run_manager: Any = None, **kwargs: Any) -> str:
+        await asyncio.sleep(self.latency)
+        text = self.respond(prompt)
+        await asyncio.sleep(self.token_latency * len(text))
+        with self._count_lock:
+            self.calls += 1
+            self.prompts += 1
+        return text
+
+
+class PrefillStubLLM(StubLLM):
+    """延遲隨提示長度增加的模擬模型
+
+    超過 context_tokens 的部分視為被截斷 (不處理也不計時)。記錄最近一次請求的提示 token 數、
+    單次請求的最長延遲，以及提示內容實際被處理的最低比例 (涵蓋率)。
+    """
+
+    per_token_latency: float = 0.000002
+    context_tokens: int = 32768
+    last_prompt_tokens: int = 0
+    max_call_ms: float = 0.0
+    min_coverage: float = 1.0
+
+    def _serve(self, prompts: List[str]) -> List[str]:
+        start = time.perf_counter()
+        tokens = [estimate_tokens(prompt) for prompt in prompts]
+        time.sleep(self.latency + self.per_token_latency * sum(min(t, self.context_tokens) for t in tokens))
+        responses = [self.respond(prompt) for prompt in prompts]
+
+        with self._count_lock:
+            self.calls += 1
+            self.prompts += len(prompts)
+            self.last_prompt_tokens = sum(tokens)
+            self.max_call_ms = max(self.max_call_ms, (time.perf_counter() - start) * 1000)
+            self.min_coverage = min([self.min_coverage] + [self.context_tokens / t for t in tokens if t])
+        return responses
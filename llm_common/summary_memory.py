@@ -0,0 +1,116 @@
+"""在背景更新摘要的對話記憶
+
+ConversationSummaryMemory 在每一輪 predict 結束前都要再呼叫一次模型更新摘要，每輪延遲因此加倍。
+BackgroundSummaryMemory 儲存對話後立即返回，摘要交給背景執行緒更新；
+背景忙碌時累積的多輪對話會合併成一次摘要呼叫。
+
+    from llm_common.summary_memory import BackgroundSummaryMemory
+
+    memory = BackgroundSummaryMemory(llm=llm)
+    conversation = ConversationChain(llm=llm, memory=memory)
+    conversation.predict(input="你好")
+    memory.flush()            # 需要最新摘要時等待背景更新完成 (非同步程式用 await memory.aflush())
+
+尚未併入摘要的對話會接在摘要後面一起提供給模型，因此不會遺漏最近的內容。
+"""
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+from pydantic import PrivateAttr
+from langchain.memory import ConversationSummaryMemory
+from langchain_core.messages import BaseMessage, get_buffer_string
+
+
+class BackgroundSummaryMemory(ConversationSummaryMemory):
+    """立即返回目前已知摘要的 ConversationSummaryMemory，摘要由背景執行緒合併更新"""
+
+    summary_calls: int = 0      # 實際呼叫模型更新摘要的次數
+    turns_saved: int = 0        # 儲存過的對話輪數
+
+    _cond: threading.Condition = PrivateAttr(default_factory=threading.Condition)
+    _pending: List[BaseMessage] = PrivateAttr(default_factory=list)
+    _in_flight: List[BaseMessage] = PrivateAttr(default_factory=list)
+    _blocked: bool = PrivateAttr(default=False)
+    _closed: bool = PrivateAttr(default=False)
+    _worker: Optional[threading.Thread] = PrivateAttr(default=None)
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        with self._cond:
+            summary = self.buffer
+            unsummarized = self._in_flight + self._pending
+
+        if self.return_messages:
+            messages = [self.summary_message_cls(content=summary)] if summary else []
+            return {self.memory_key: messages + unsummarized}
+
+        recent = get_buffer_string(unsummarized, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        return {self.memory_key: "\n".join(filter(None, [summary, recent]))}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        # 只把對話加入記錄，不等待摘要更新
+        super(ConversationSummaryMemory, self).save_context(inputs, outputs)
+        with self._cond:
+            self._pending.extend(self.chat_memory.messages[-2:])
+            self.turns_saved += 1
+            self._blocked = False
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._summary_loop, daemon=True)
+                self._worker.start()
+            self._cond.notify_all()
+
+    def _summary_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or (self._pending and not self._blocked))
+                if not self._pending or self._blocked:
+                    return
+                # 一次取出所有等待中的對話，合併成一次摘要呼叫
+                batch, self._pending = self._pending, []
+                self._in_flight = batch
+                summary = self.buffer
+
+            try:
+                new_summary = self.predict_new_summary(batch, summary)
+            except Exception:
+                new_summary = None
+
+            with self._cond:
+                self._in_flight = []
+                if new_summary is None:
+                    # 失敗時把對話放回佇列，等下一輪對話或 flush() 再重試，避免不停重試
+                    self._pending = batch + self._pending
+                    self._blocked = True
+                else:
+                    self.buffer = new_summary
+                    self.summary_calls += 1
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待所有已儲存的對話併入摘要；成功返回 True，逾時或摘要失敗返回 False"""
+        with self._cond:
+            if self._pending and self._blocked:
+                self._blocked = False
+                self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._in_flight and (not self._pending or self._blocked), timeout)
+            return not self._in_flight and not self._pending
+
+    async def aflush(self, timeout: Optional[float] = None) -> bool:
+        """flush() 的非同步版本"""
+        return await asyncio.to_thread(self.flush, timeout)
+
+    def close(self):
+        """處理完等待中的對話後停止背景執行緒"""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            worker, self._worker = self._worker, None
+            self._cond.notify_all()
+        if worker is not None:
+            worker.join()
+
+    def clear(self) -> None:
+        self.flush()
+        with self._cond:
+            super().clear()
+            self._pending = []
@@ -0,0 +1,17 @@
+"""粗略估計 token 數 (不需要載入模型的 tokenizer)
+
+    from llm_common.tokens import estimate_tokens
+
+中日韓文字 (含全形標點) 大約一個字一個 token，其他文字大約四個字元一個 token。
+"""
+import re
+
+_CJK = re.compile(r"[　-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文字的 token 數"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4